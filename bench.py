@@ -0,0 +1,344 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import subprocess
+
+# Benchmark campaign over the kernels in source/: each kernel runs testing.py's loop for a fixed number of rounds
+# with a fixed seed, the rule-based responder of llm_server.py in place of the GPT call and a native stand-in for Vitis csim, in its own
+# process so that testing.py's module state starts fresh for every kernel. Kernels without a testbench or rules are
+# skipped. The metrics (vectors/s, time and round of the first discrepancy, rounds to all errors, mutation and
+# comparator throughput) are saved to baseline_file, which holds the committed reference run by default.
+repo_dir = os.path.dirname(os.path.abspath(__file__))
+source_dir = os.path.join(repo_dir, "source")
+bench_dir = os.path.join(repo_dir, "bench")
+work_dir = os.path.join(bench_dir, "work")
+baseline_file = os.path.join(bench_dir, "baseline.json")
+
+bench_seed = 1234
+bench_rounds = 10
+bench_vectors = 20
+
+# Native csim stand-in: the CPU testbench output is wrapped to this signed bit width, like an ap_int datapath would
+standin_bits = 16
+
+# Boundary values mixed into the stand-in LLM's vectors: those of the stand-in datapath. The 32-bit limits of
+# llm_server.py are left out because some CPU references (e.g. bfs on INT_MIN) crash on them and end the campaign.
+standin_boundary_values = [0, -1, 1, 2**7 - 1, -2**7, 2**15 - 1, -2**15, 2**16 - 1]
+
+# Integers per test vector line of each kernel (min, max); the range of values matches mutate.py
+vector_lengths = {"bfs": (4, 8), "dfs": (4, 8), "ga": (2, 6), "gc": (2, 2)}
+default_vector_length = (2, 8)
+
+# .dat lines the testbench of a kernel reads per test case, where it is not one
+lines_per_vector = {"ga": 2}
+value_range = (-2**12, 2**12 - 1)
+
+# Relative change of a timing metric that counts as a regression in --compare
+regression_tolerance = 0.2
+
+# Files a kernel directory needs to be benchmarked
+kernel_files = ["kernel.cpp", "kernel_testbench.cpp", "rules.json"]
+
+# Kernels that are expected to fail in this tree, with the reason recorded in the results
+known_failures = {"gc": "source/gc/kernel.cpp and kernel_testbench.cpp include bubble.h, which is not in the repository"}
+
+
+def random_vectors(rng, kernel, count):
+    low, high = vector_lengths.get(kernel, default_vector_length)
+    lines = []
+    for _ in range(count):
+        length = rng.randint(low, high)
+        lines.append(" ".join(str(rng.randint(*value_range)) for _ in range(length)))
+    return lines
+
+
+def wrap_signed(value, bits):
+    half = 1 << (bits - 1)
+    return (value + half) % (1 << bits) - half
+
+
+def standin_row(line, bits):
+    """Wrap every integer token of a spectra row to a signed bits-wide value and keep other tokens as they are"""
+    tokens = []
+    for token in line.split():
+        try:
+            tokens.append(str(wrap_signed(int(token), bits)))
+        except ValueError:
+            tokens.append(token)
+    return " ".join(tokens) + "\n"
+
+
+def prepare_workspace(kernel, workspace, seed):
+    """Lay out the CPU side (co/) and the HLS side (hlso/) of a kernel and write its seeded 1.dat"""
+    if os.path.exists(workspace):
+        shutil.rmtree(workspace)
+    co_dir = os.path.join(workspace, "co")
+    hlso_dir = os.path.join(workspace, "hlso")
+    os.makedirs(co_dir)
+    os.makedirs(hlso_dir)
+    kernel_dir = os.path.join(source_dir, kernel)
+    for fname in os.listdir(kernel_dir):
+        if fname.endswith((".cpp", ".h", ".hpp")):
+            shutil.copy(os.path.join(kernel_dir, fname), co_dir)
+    shutil.copy(os.path.join(kernel_dir, "kernel.cpp"), hlso_dir)
+    shutil.copy(os.path.join(kernel_dir, "rules.json"), hlso_dir)
+    with open(os.path.join(hlso_dir, "1.dat"), 'w') as f:
+        f.writelines(f"{line}\n" for line in random_vectors(random.Random(seed), kernel, bench_vectors))
+    return co_dir, hlso_dir
+
+
+def configure_testing(testing, co_dir, hlso_dir, seed):
+    """Point testing.py's module configuration at the workspace and swap in the LLM and Vitis stand-ins"""
+    import rules
+    import spans
+    import llm
+    import llm_server
+
+    testing.hlso_base_dir = hlso_dir
+    testing.co_base_dir = co_dir
+    testing.mutate_script = os.path.join(repo_dir, "mutate.py")
+    testing.diff_dir = os.path.join(hlso_dir, "diff")
+    testing.spectre_dir = os.path.join(hlso_dir, "spectre")
+    testing.gt_dir = os.path.join(hlso_dir, "gt")
+    testing.report_file = os.path.join(hlso_dir, "report.txt")
+    testing.report_simple_file = os.path.join(hlso_dir, "report_simple.txt")
+    testing.report_index_file = os.path.join(hlso_dir, "report_index.json")
+    testing.mutation_weights_file = os.path.join(hlso_dir, "check", "mutation_weights.json")
+    testing.checkpoint_file = os.path.join(hlso_dir, "checkpoint.json")
+    testing.spans_file = os.path.join(hlso_dir, "timing", "spans.jsonl")
+    testing.spans_summary_file = os.path.join(hlso_dir, "timing", "summary.json")
+    spans.configure(testing.spans_file)
+    testing.cpp_build_dir = os.path.join(co_dir, "build")
+    testing.hls_project_dir = os.path.join(hlso_dir, "hls_project")
+    testing.native_build_dir = os.path.join(hlso_dir, "build")
+    testing.tiered_simulation = False
+    testing.raf_index_file = os.path.join(hlso_dir, "raf_index.txt")
+    testing.raf_index = set()
+    for directory in (testing.diff_dir, testing.spectre_dir, testing.gt_dir):
+        os.makedirs(directory, exist_ok=True)
+
+    testing.rule_spec_file = os.path.join(hlso_dir, "rules.json")
+    testing.rule_table = rules.compile_rules(rules.load_rule_spec(testing.rule_spec_file))
+    testing.spectre_files = [entry["hls_file"] for entry in testing.rule_table]
+    testing.global_line_number = {fname: 1 for fname in testing.spectre_files}
+    testing.error_types = {error_type: False for error_type in rules.error_type_names(testing.rule_table)}
+    testing.all_error_types = set(testing.error_types.keys())
+    testing.global_detected_errors.clear()
+
+    #  The rule-based responder of the LLM stand-in server, called in process; it is seeded by the prompt,
+    #  independent of the campaign RNG
+    llm.register_backend("standin", lambda model, messages, **params: llm_server.respond(model, messages, {}, seed))
+    llm.backend = "standin"
+    llm_server.boundary_values = standin_boundary_values
+
+    def vitis_standin(dat_file, hls_output_dir, shard=None):
+        os.makedirs(hls_output_dir, exist_ok=True)
+        binary = testing.build_cached_binary(
+            [os.path.join(co_dir, "kernel.cpp"), os.path.join(co_dir, "kernel_testbench.cpp")],
+            testing.cpp_build_dir, testing.cpp_compiler, testing.cpp_build_flags(), "test"
+        )
+        cpu_output_dir = f"{hls_output_dir}_cpu"
+        os.makedirs(cpu_output_dir, exist_ok=True)
+        with spans.span("csim", standin=True, shard=shard):
+            subprocess.run([binary, dat_file, cpu_output_dir, "0"], check=True, stdout=subprocess.DEVNULL)
+            for entry in testing.rule_table:
+                cpu_path = os.path.join(cpu_output_dir, entry["cpu_file"])
+                if not os.path.exists(cpu_path):
+                    continue
+                with open(cpu_path, 'r') as src, open(os.path.join(hls_output_dir, entry["hls_file"]), 'w') as dst:
+                    dst.writelines(standin_row(line, standin_bits) for line in src)
+
+    #  Stands in for one simulation run, so rounds are still sharded and merged like with Vitis
+    testing.simulate_shard = vitis_standin
+
+
+def count_lines(path):
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def run_kernel(kernel, seed, rounds):
+    """
+    Run the benchmark campaign of one kernel in this process.
+    :return: Metrics of the campaign
+    """
+    workspace = os.path.join(work_dir, kernel)
+    co_dir, hlso_dir = prepare_workspace(kernel, workspace, seed)
+
+    #  testing.py creates its default directories on import; keep them inside the workspace
+    os.chdir(workspace)
+    sys.path.insert(0, repo_dir)
+    import testing
+    import spans
+
+    configure_testing(testing, co_dir, hlso_dir, seed)
+    testing.lines_per_vector = lines_per_vector.get(kernel, 1)
+    random.seed(seed)
+
+    history = []
+    compare_results = testing.compare_results
+
+    def recorded_compare(test_id, dat_file):
+        detected = compare_results(test_id, dat_file)
+        history.append({
+            "round": test_id,
+            "elapsed_s": time.perf_counter() - start,
+            "vectors": count_lines(dat_file),
+            "errors": sorted(error_type for error_type, found in detected.items() if found),
+        })
+        return detected
+
+    testing.compare_results = recorded_compare
+    start = time.perf_counter()
+    testing.main(max_rounds=rounds)
+    wall = time.perf_counter() - start
+
+    stages = spans.summary()
+    all_errors = len(testing.error_types)
+    first = next((record for record in history if record["errors"]), None)
+    complete = next((record for record in history if len(record["errors"]) == all_errors), None)
+    vectors = sum(record["vectors"] for record in history)
+    mutated = sum(count_lines(os.path.join(hlso_dir, f"{test_id}.dat")) for test_id in range(1, stages.get("mutation", {}).get("count", 0) + 1))
+
+    def per_second(count, stage):
+        seconds = stages.get(stage, {}).get("wall_s", 0.0)
+        return round(count / seconds, 2) if seconds else None
+
+    return {
+        "status": "ok",
+        "rounds": len(history),
+        "vectors": vectors,
+        "error_types": all_errors,
+        "errors_detected": history[-1]["errors"] if history else [],
+        "first_discrepancy_round": first["round"] if first else None,
+        "rounds_to_all_errors": complete["round"] if complete else None,
+        "wall_s": round(wall, 3),
+        "vectors_per_s": round(vectors / wall, 2) if wall else None,
+        "time_to_first_discrepancy_s": round(first["elapsed_s"], 3) if first else None,
+        "mutation_vectors_per_s": per_second(mutated, "mutation"),
+        "comparator_rows_per_s": per_second(vectors * len(testing.rule_table), "diff"),
+        "stages": {name: {"count": stage["count"], "wall_s": round(stage["wall_s"], 4)} for name, stage in stages.items()},
+    }
+
+
+def benchmark_kernel(kernel, seed, rounds):
+    """Run one kernel in a child process and collect its metrics; its output goes to bench/work/<kernel>.log"""
+    missing = [fname for fname in kernel_files if not os.path.exists(os.path.join(source_dir, kernel, fname))]
+    if missing:
+        return {"status": "skipped", "reason": f"missing {', '.join(missing)}"}
+
+    os.makedirs(work_dir, exist_ok=True)
+    result_file = os.path.join(work_dir, f"{kernel}.json")
+    log_file = os.path.join(work_dir, f"{kernel}.log")
+    if os.path.exists(result_file):
+        os.remove(result_file)
+    command = [sys.executable, os.path.abspath(__file__), "--run-kernel", kernel,
+               "--seed", str(seed), "--rounds", str(rounds), "--result", result_file]
+    with open(log_file, 'w') as log:
+        completed = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+    if completed.returncode != 0 or not os.path.exists(result_file):
+        result = {"status": "failed", "reason": f"exit code {completed.returncode}, see {os.path.relpath(log_file, repo_dir)}"}
+        if kernel in known_failures:
+            result["known_failure"] = known_failures[kernel]
+        return result
+    with open(result_file, 'r') as f:
+        return json.load(f)
+
+
+def compare_baselines(old, new, tolerance=regression_tolerance):
+    """
+    Print the metrics of two benchmark runs side by side.
+    :return: List of "<kernel> <metric>" regressions
+    """
+    higher_is_better = ["vectors_per_s", "mutation_vectors_per_s", "comparator_rows_per_s"]
+    lower_is_better = ["time_to_first_discrepancy_s", "wall_s"]
+    rounds_metrics = ["first_discrepancy_round", "rounds_to_all_errors"]
+    regressions = []
+
+    for kernel in sorted(set(old["kernels"]) | set(new["kernels"])):
+        before, after = old["kernels"].get(kernel, {}), new["kernels"].get(kernel, {})
+        print(f"== {kernel}: {before.get('status', 'absent')} -> {after.get('status', 'absent')}")
+        if before.get("status") != "ok" or after.get("status") != "ok":
+            if before.get("status") == "ok" and kernel in new["kernels"]:
+                regressions.append(f"{kernel} status")
+            continue
+        for metric in higher_is_better + lower_is_better + rounds_metrics:
+            a, b = before.get(metric), after.get(metric)
+            if a == b:
+                flag = ""
+            elif metric in rounds_metrics:
+                flag = "REGRESSION" if b is None or (a is not None and b > a) else ""
+            elif a is None or b is None:
+                flag = "REGRESSION" if b is None else ""
+            elif metric in higher_is_better:
+                flag = "REGRESSION" if b < a * (1 - tolerance) else ""
+            else:
+                flag = "REGRESSION" if b > a * (1 + tolerance) else ""
+            print(f"  {metric:<30}{str(a):>14}{str(b):>14}  {flag}")
+            if flag:
+                regressions.append(f"{kernel} {metric}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the testing loop on the kernels in source/")
+    parser.add_argument("--kernels", nargs="*", default=None, help="kernels to run (default: every directory in source/)")
+    parser.add_argument("--seed", type=int, default=bench_seed)
+    parser.add_argument("--rounds", type=int, default=bench_rounds)
+    parser.add_argument("--output", default=baseline_file, help="where to save the results")
+    parser.add_argument("--compare", default=None, help="earlier results to compare against; exits with 1 on a regression")
+    parser.add_argument("--run-kernel", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--result", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_kernel:
+        result = run_kernel(args.run_kernel, args.seed, args.rounds)
+        with open(args.result, 'w') as f:
+            json.dump(result, f)
+        return
+
+    old = None
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            old = json.load(f)
+
+    kernels = args.kernels or sorted(name for name in os.listdir(source_dir) if os.path.isdir(os.path.join(source_dir, name)))
+    results = {
+        "config": {
+            "seed": args.seed, "rounds": args.rounds, "vectors": bench_vectors, "standin_bits": standin_bits,
+            "python": platform.python_version(), "machine": platform.machine(),
+        },
+        "kernels": {},
+    }
+    for kernel in kernels:
+        print(f"Benchmarking {kernel}...")
+        result = benchmark_kernel(kernel, args.seed, args.rounds)
+        results["kernels"][kernel] = result
+        if result["status"] == "ok":
+            print(f"  {result['vectors_per_s']} vectors/s, first discrepancy in round {result['first_discrepancy_round']} "
+                  f"({result['time_to_first_discrepancy_s']} s), all errors in round {result['rounds_to_all_errors']}")
+        else:
+            print(f"  {result['status']}: {result.get('known_failure', result['reason'])}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"Results saved to {args.output}")
+
+    if old is not None:
+        regressions = compare_baselines(old, results)
+        if regressions:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,13 +2,42 @@ import os
 import time
 import re
 import sys
+import hashlib
+import hls_worker
 
 # Put the directory where the current script is located as base_dir, assuming compile.py is placed in the instance folder
 base_dir = os.path.dirname(os.path.abspath(__file__))
 
-def create_vitis_tcl_script(kernel_path, testbench_path, extra_files, input_file_path, output_dir):
-    """Generate a TCL script running by Vitis HLS"""
+def synthesis_key(kernel_path, testbench_path, extra_files):
+    """Hash of the sources the synthesized solution in p1 was built from (kernel with pragmas, extra files, testbench)"""
+    digest = hashlib.sha256()
+    for path in [kernel_path] + list(extra_files) + [testbench_path]:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def create_vitis_tcl_script(kernel_path, testbench_path, extra_files, input_file_path, output_dir, reuse_solution=False, hls_exec=3):
+    """Generate a TCL script running by Vitis HLS.
+    With reuse_solution the synthesized p1/solution1 is opened without reset and only csim/cosim are run.
+    hls_exec selects the steps after csim: 1 csynth, 2 also cosim, 3 also export_design (a reused solution skips csynth)."""
     tcl_script_path = os.path.join(base_dir, 'run_vitis.tcl')
+    if reuse_solution:
+        with open(tcl_script_path, 'w') as f:
+            f.write('open_project p1\n')
+            f.write('open_solution solution1\n')
+            f.write(f'set hls_exec {hls_exec}\n')
+            f.write(f'set kernel_path "{input_file_path}"\n')
+            f.write(f'set output_dir "{output_dir}"\n')
+            f.write(f'csim_design -argv "$kernel_path $output_dir"\n')
+            f.write('if {$hls_exec == 2} {\n')
+            f.write('    cosim_design -argv "$kernel_path $output_dir"\n')
+            f.write('} elseif {$hls_exec == 3} {\n')
+            f.write('    cosim_design -argv "$kernel_path $output_dir"\n')
+            f.write('    export_design\n')
+            f.write('}\n')
+            f.write('quit\n')
+        return tcl_script_path
     with open(tcl_script_path, 'w') as f:
         f.write('open_project -reset p1\n')
         f.write(f'add_files {kernel_path}\n')
@@ -19,7 +48,7 @@ def create_vitis_tcl_script(kernel_path, testbench_path, extra_files, input_file
         f.write('set_top addAndDivideAndMultiply\n')
         f.write('set_part {xcvu9p-flga2104-2-i}\n')
         f.write('create_clock -period 10\n')
-        f.write('set hls_exec 3\n')
+        f.write(f'set hls_exec {hls_exec}\n')
         f.write(f'set kernel_path "{input_file_path}"\n')
         f.write(f'set output_dir "{output_dir}"\n')
         f.write(f'csim_design -argv "$kernel_path $output_dir"\n')
@@ -39,13 +68,11 @@ def create_vitis_tcl_script(kernel_path, testbench_path, extra_files, input_file
     return tcl_script_path
 
 def run_tcl_script(tcl_script_path, vitis_bin):
-    """Run the TCL script of Vitis HLS and time it"""
-    command = f'{vitis_bin}/vitis-run --mode hls --tcl {tcl_script_path}'
-    start_time = time.time()
-    os.system(command)
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    return elapsed_time
+    """Run the TCL script of Vitis HLS in a persistent HLS session and time it; the output goes to logs/hls_run_tcl.log"""
+    log_file_path = os.path.join(base_dir, 'logs', 'hls_run_tcl.log')
+    result = hls_worker.run_script(tcl_script_path, vitis_bin, cwd=base_dir, log_file=log_file_path)
+    print(result["output"], end="")
+    return result["elapsed_s"]
 
 def check_report():
     """Check the comprehensive report to determine whether there are any errors"""
@@ -63,15 +90,28 @@ def check_report():
     metrics = {}
     return result, metrics
 
-def main(kernel_path, testbench_path, input_file_path, output_dir, vitis_bin):
+def main(kernel_path, testbench_path, input_file_path, output_dir, vitis_bin, hls_exec=3):
     """Main process: generate TCL, run HLS, check the results, and calculate the total time"""
     print("Starting Vitis HLS synthesis...")
     total_start_time = time.time()
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    tcl_script_path = create_vitis_tcl_script(kernel_path, testbench_path, [], input_file_path, output_dir)
+    # Reuse the synthesized solution when kernel and testbench are unchanged since the last successful run
+    key = synthesis_key(kernel_path, testbench_path, [])
+    key_file = os.path.join(base_dir, 'p1', 'csynth.key')
+    reuse_solution = False
+    if os.path.exists(key_file):
+        with open(key_file, 'r') as f:
+            reuse_solution = f.read().strip() == key
+    if reuse_solution:
+        print("Kernel unchanged, reusing the synthesized solution in p1.")
+    tcl_script_path = create_vitis_tcl_script(kernel_path, testbench_path, [], input_file_path, output_dir, reuse_solution, hls_exec)
     elapsed_time = run_tcl_script(tcl_script_path, vitis_bin)
     result, metrics = check_report()
+    if result == 'PASS' and not reuse_solution:
+        os.makedirs(os.path.dirname(key_file), exist_ok=True)
+        with open(key_file, 'w') as f:
+            f.write(key + '\n')
     total_end_time = time.time()
     total_elapsed_time = total_end_time - total_start_time
     print(f"Vitis HLS synthesis completed. Total execution time: {total_elapsed_time:.2f} seconds")
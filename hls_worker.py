@@ -0,0 +1,460 @@
+import os
+import re
+import sys
+import time
+import queue
+import shlex
+import atexit
+import argparse
+import shutil
+import signal
+import subprocess
+import threading
+
+# Long-lived HLS TCL sessions used by testing.py, tb_gene.py and compile.py instead of one `vitis-run --mode hls --tcl`
+# process per script, so the tool and license startup is paid once per session rather than once per run.
+# A session reads TCL from its stdin; every job is a generated script (project, solution, argv and the design steps)
+# that the session sources, followed by a marker line that carries the result code back over stdout.
+# Session backends:
+#   "vitis"  the interactive Vitis HLS shell of vitis_bin (session_command, overridable with HLSOLLM_HLS_SESSION_COMMAND)
+#   "fake"   a small stand-in session of this script that understands the generated scripts, for testing without Vitis
+# Further backends can be added with register_backend. Sessions are opt-in with HLSOLLM_HLS_WORKER=1 until the
+# session command has been verified against a real Vitis install; by default every script runs in its own
+# `vitis-run --mode hls --tcl` process as before.
+enabled = os.environ.get("HLSOLLM_HLS_WORKER", "0") != "0"
+backend = os.environ.get("HLSOLLM_HLS_BACKEND", "vitis")
+session_command = os.environ.get("HLSOLLM_HLS_SESSION_COMMAND", "{vitis_bin}/vitis-run --mode hls --itcl")
+
+# Sessions per process; a job waits for a free one. A session is restarted after max_jobs_per_worker jobs to bound
+# the memory the tool accumulates, and whenever it dies or exceeds job_timeout seconds.
+slots = int(os.environ.get("HLSOLLM_HLS_WORKERS", 2))
+max_jobs_per_worker = int(os.environ.get("HLSOLLM_HLS_WORKER_JOBS", 100))
+job_timeout = float(os.environ.get("HLSOLLM_HLS_JOB_TIMEOUT", 0)) or None
+startup_timeout = 300
+
+# Fake session: command run in place of csim_design/cosim_design with the script's argv appended (e.g. a natively
+# built testbench), and seconds slept at startup to mimic the tool's
+fake_csim_command = os.environ.get("HLSOLLM_HLS_FAKE_CSIM", "")
+fake_startup_delay = float(os.environ.get("HLSOLLM_HLS_FAKE_STARTUP", 0))
+
+marker = "@@hlsworker"
+
+# Sessions per (backend, vitis_bin): {"idle": [...], "slots": Semaphore, "lock": Lock}
+pools = {}
+pools_lock = threading.Lock()
+# Every running session by id, idle or busy, so none outlives the process
+live_workers = {}
+worker_ids = iter(range(1, sys.maxsize))
+
+
+def vitis_session(vitis_bin):
+    return shlex.split(session_command.format(vitis_bin=vitis_bin))
+
+
+def fake_session(vitis_bin):
+    return [
+        sys.executable, os.path.abspath(__file__), "--fake-session",
+        "--csim", fake_csim_command, "--startup", str(fake_startup_delay),
+    ]
+
+
+backends = {"vitis": vitis_session, "fake": fake_session}
+
+
+def register_backend(name, command_func):
+    """Make command_func(vitis_bin) -> argv of an interactive TCL session selectable as backend name"""
+    backends[name] = command_func
+
+
+def read_lines(stream, lines):
+    for line in stream:
+        lines.put(line)
+    lines.put(None)
+
+
+def send(worker, *commands):
+    worker["process"].stdin.write("".join(command + "\n" for command in commands))
+    worker["process"].stdin.flush()
+
+
+def collect(worker, tag, timeout, stream=None):
+    """
+    Read session output up to the marker line of tag.
+    :param stream: File the output lines are also written to as they arrive
+    :return: (output lines before the marker, text after the marker), or (lines, None) when the session ended
+             or the timeout expired first
+    """
+    deadline = time.time() + timeout if timeout else None
+    output = []
+    while True:
+        try:
+            line = worker["lines"].get(timeout=max(0.0, deadline - time.time()) if deadline else None)
+        except queue.Empty:
+            return output, None
+        if line is None:
+            return output, None
+        position = line.find(f"{marker} {tag}")
+        if position >= 0:
+            #  Interactive shells may print their prompt in front of the marker
+            if position:
+                output.append(line[:position] + "\n")
+                echo(stream, output[-1])
+            return output, line[position + len(marker) + len(tag) + 2:].strip()
+        output.append(line)
+        echo(stream, line)
+
+
+def echo(stream, line):
+    if stream is not None:
+        stream.write(line)
+        stream.flush()
+
+
+def start_worker(command):
+    if not os.path.isfile(command[0]) and not shutil.which(command[0]):
+        raise FileNotFoundError(f"HLS session binary not found at {command[0]}")
+    start_time = time.time()
+    #  Own process group, so that stop_worker can kill a stuck session with the simulators it started; run.py stops
+    #  these groups as well when it kills a timed out tb_gene.py
+    process = subprocess.Popen(
+        command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1,
+        start_new_session=True,
+    )
+    worker = {"id": next(worker_ids), "process": process, "lines": queue.Queue(), "jobs": 0}
+    live_workers[worker["id"]] = worker
+    threading.Thread(target=read_lines, args=(process.stdout, worker["lines"]), daemon=True).start()
+    send(worker, f'puts "{marker} ready"', "flush stdout")
+    output, status = collect(worker, "ready", startup_timeout)
+    if status is None:
+        stop_worker(worker, kill=True)
+        raise RuntimeError(f"HLS session {' '.join(command)} did not start:\n{''.join(output)}")
+    worker["startup_s"] = time.time() - start_time
+    print(f"Started HLS session {worker['id']} in {worker['startup_s']:.1f} seconds")
+    return worker
+
+
+def stop_worker(worker, kill=False):
+    """Ask the session to exit, or kill it with the simulators it started (a stuck or broken session)"""
+    process = worker["process"]
+    if process.poll() is None and not kill:
+        try:
+            send(worker, "exit")
+            process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            kill = True
+    if process.poll() is None or kill:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+    live_workers.pop(worker["id"], None)
+
+
+def group_usage(pgid):
+    """
+    CPU time and memory of the processes in process group pgid (a session with the simulators it started), read
+    from /proc, so Linux only. The CPU time includes the children these processes have reaped, so the CPU time of a
+    job is the difference of the readings before and after it.
+    :return: (cpu_s, rss_kb, peak_rss_kb) summed over the processes of the group, or None without /proc
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    cpu_ticks = 0
+    rss_kb = 0
+    peak_rss_kb = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                #  The command name in parentheses may contain spaces, the fields after it do not
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[2]) != pgid:
+                continue
+            with open(f"/proc/{entry}/status", 'r') as f:
+                status = dict(line.split(":", 1) for line in f if ":" in line)
+        except (OSError, IndexError, ValueError):
+            continue
+        #  utime, stime, cutime and cstime
+        cpu_ticks += sum(int(value) for value in fields[11:15])
+        rss_kb += int(status.get("VmRSS", "0 kB").split()[0])
+        peak_rss_kb += int(status.get("VmHWM", "0 kB").split()[0])
+    return cpu_ticks / os.sysconf("SC_CLK_TCK"), rss_kb, peak_rss_kb
+
+
+def reset_peak_rss(pgid):
+    """Restart the VmHWM high-water marks of the processes in process group pgid from their current RSS"""
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", 'r') as f:
+                if int(f.read().rsplit(")", 1)[1].split()[2]) != pgid:
+                    continue
+            with open(f"/proc/{entry}/clear_refs", 'w') as f:
+                f.write("5")
+        except (OSError, IndexError, ValueError):
+            continue
+
+
+def job_usage(before, after):
+    """
+    Usage fields of a job result from group_usage readings before and after it: cpu_s of the session and its
+    simulators, rss_kb of the group at the end of the job and peak_rss_kb, the high-water mark during the job of the
+    processes still running at its end (simulators that already exited are in cpu_s only)
+    """
+    if before is None or after is None:
+        return {}
+    return {"cpu_s": max(0.0, after[0] - before[0]), "rss_kb": after[1], "peak_rss_kb": after[2]}
+
+
+def session_script(tcl_script_path):
+    """Copy of the script without its quit/exit lines, which would end the session"""
+    job_path = f"{tcl_script_path}.session.tcl"
+    with open(tcl_script_path, 'r') as f:
+        lines = [line for line in f if line.strip() not in ("quit", "exit")]
+    with open(job_path, 'w') as f:
+        f.writelines(lines)
+    return job_path
+
+
+def run_job(worker, tcl_script_path, cwd, timeout, stream=None):
+    worker["jobs"] += 1
+    tag = f"done {worker['jobs']}"
+    job_path = session_script(tcl_script_path)
+    pgid = worker["process"].pid
+    reset_peak_rss(pgid)
+    before = group_usage(pgid)
+    try:
+        send(
+            worker,
+            f"cd {{{cwd}}}",
+            f"set hlsworker_rc [catch {{source {{{job_path}}}}} hlsworker_msg]",
+            'if {$hlsworker_rc} {puts "ERROR: $hlsworker_msg"}',
+            #  Leave no project open for the next job
+            "catch {close_project}",
+            f'puts "{marker} {tag} $hlsworker_rc"',
+            "flush stdout",
+        )
+    except OSError:
+        #  The session ended while it was idle
+        return {"status": "crashed", "returncode": -1, "output": ""}
+    output, status = collect(worker, tag, timeout, stream)
+    usage = job_usage(before, group_usage(pgid))
+    if status is None:
+        crashed = worker["process"].poll() is not None
+        return {"status": "crashed" if crashed else "timeout", "returncode": -1, "output": "".join(output), **usage}
+    returncode = int(status) if status.lstrip("-").isdigit() else -1
+    return {"status": "ok" if returncode == 0 else "error", "returncode": returncode, "output": "".join(output), **usage}
+
+
+def pool_for(key):
+    with pools_lock:
+        if key not in pools:
+            pools[key] = {"idle": [], "slots": threading.Semaphore(slots), "lock": threading.Lock()}
+        return pools[key]
+
+
+def run_batch(tcl_script_path, vitis_bin, cwd, stream=None):
+    command = [os.path.join(vitis_bin, "vitis-run"), "--mode", "hls", "--tcl", tcl_script_path]
+    if not os.path.exists(command[0]):
+        raise FileNotFoundError(f"Vitis 'vitis-run' binary not found at {command[0]}")
+    output = []
+    with subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True) as process:
+        for line in process.stdout:
+            output.append(line)
+            echo(stream, line)
+        #  Reaped here rather than by Popen, for the resource usage of this process and the children it reaped alone
+        _, wait_status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(wait_status)
+    returncode = process.returncode
+    return {
+        "status": "ok" if returncode == 0 else "error", "returncode": returncode, "output": "".join(output),
+        "cpu_s": usage.ru_utime + usage.ru_stime, "peak_rss_kb": usage.ru_maxrss,
+    }
+
+
+def run_script(tcl_script_path, vitis_bin, cwd=None, log_file=None, timeout=None, stream=None):
+    """
+    Run a generated TCL script in a free session of the configured backend.
+    :param cwd: Directory relative project paths are resolved against, the current directory by default
+    :param log_file: File receiving the job's output, like the log of a one-shot vitis-run
+    :param timeout: Seconds before the session is killed, job_timeout by default
+    :param stream: File the output is written to while the job runs (e.g. sys.stdout), like a one-shot vitis-run
+    :return: {"status": "ok" | "error" | "timeout" | "crashed", "returncode", "output", "elapsed_s", "worker", "startup_s"}
+             where startup_s is the session startup paid by this job (0 when an open session was reused), with the
+             CPU seconds (cpu_s) and peak resident memory in kB (peak_rss_kb) of the job when they can be measured,
+             see job_usage for sessions
+    """
+    cwd = os.path.abspath(cwd or os.getcwd())
+    tcl_script_path = os.path.abspath(tcl_script_path)
+    start_time = time.time()
+    if not enabled:
+        result = run_batch(tcl_script_path, vitis_bin, cwd, stream)
+        result.update(worker=None, startup_s=time.time() - start_time)
+    else:
+        if backend not in backends:
+            raise ValueError(f"Unknown HLS session backend '{backend}', expected one of {', '.join(backends)}")
+        pool = pool_for((backend, vitis_bin))
+        with pool["slots"]:
+            with pool["lock"]:
+                worker = pool["idle"].pop() if pool["idle"] else None
+            startup_s = 0.0
+            if worker is None:
+                worker = start_worker(backends[backend](vitis_bin))
+                startup_s = worker["startup_s"]
+            result = run_job(worker, tcl_script_path, cwd, timeout or job_timeout, stream)
+            result.update(worker=worker["id"], startup_s=startup_s)
+            if result["status"] in ("ok", "error") and worker["jobs"] < max_jobs_per_worker:
+                with pool["lock"]:
+                    pool["idle"].append(worker)
+            else:
+                if result["status"] in ("timeout", "crashed"):
+                    print(f"HLS session {worker['id']} {result['status']} on {tcl_script_path}, it will be restarted")
+                stop_worker(worker, kill=result["status"] in ("timeout", "crashed"))
+    result["elapsed_s"] = time.time() - start_time
+    if log_file:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        with open(log_file, 'w') as f:
+            f.write(result["output"])
+    return result
+
+
+@atexit.register
+def shutdown():
+    """Close every session of this process"""
+    with pools_lock:
+        for pool in pools.values():
+            with pool["lock"]:
+                pool["idle"].clear()
+    for worker in list(live_workers.values()):
+        stop_worker(worker)
+
+
+# --------------------------------------------------------------------------------------------------------------------------------
+# Fake session: executes the protocol lines above and, in sourced scripts, `set`, `if {$var == value}` chains and the
+# design steps. csim_design and cosim_design run fake_csim_command with the script's argv when it is set.
+
+def substitute(text, variables):
+    return re.sub(r"\$(\w+)", lambda m: variables.get(m.group(1), m.group(0)), text)
+
+
+def unquote(text):
+    text = text.strip()
+    if len(text) >= 2 and (text[0], text[-1]) in (('"', '"'), ('{', '}')):
+        return text[1:-1]
+    return text
+
+
+def fake_condition(condition, variables):
+    left, operator, right = re.match(r"\s*(\S+)\s*(==|!=)\s*(\S+)\s*$", condition).groups()
+    equal = substitute(left, variables) == substitute(right, variables)
+    return equal if operator == "==" else not equal
+
+
+def fake_step(command, args, variables):
+    """Run one design step; returns False when the step failed"""
+    if command in ("csim_design", "cosim_design"):
+        argv = re.search(r'-argv\s+("[^"]*"|\{[^}]*\}|\S+)', args)
+        argv = shlex.split(substitute(unquote(argv.group(1)), variables)) if argv else []
+        returncode = 0
+        if fake_csim_command:
+            result = subprocess.run(shlex.split(fake_csim_command) + argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            sys.stdout.write(result.stdout)
+            returncode = result.returncode
+        if command == "csim_design":
+            if returncode:
+                print("ERROR: [SIM 211-100] 'csim_design' failed: nonzero return value.")
+                return False
+            print("INFO: [SIM 211-1] CSim done with 0 errors.")
+        else:
+            if returncode:
+                print("ERROR: [COSIM 212-4] *** C/RTL co-simulation finished: FAIL ***")
+                return False
+            print("INFO: [COSIM 212-1000] *** C/RTL co-simulation finished: PASS ***")
+        return True
+    print(f"INFO: [HLS 200-111] Finished Command {command} {substitute(args, variables)}".rstrip())
+    return True
+
+
+def fake_source(path, variables):
+    """Execute a generated script; returns (result code, message)"""
+    branches = []  # [active, taken] per open if chain
+    with open(path, 'r') as f:
+        lines = [line.strip() for line in f]
+    for line in lines:
+        if not line or line.startswith("#"):
+            continue
+        enclosing = all(active for active, _ in branches)
+        match = re.match(r"if \{(.*)\} \{$", line)
+        if match:
+            taken = enclosing and fake_condition(match.group(1), variables)
+            branches.append([taken, taken])
+            continue
+        match = re.match(r"\} elseif \{(.*)\} \{$", line)
+        if match:
+            enclosing = all(active for active, _ in branches[:-1])
+            taken = enclosing and not branches[-1][1] and fake_condition(match.group(1), variables)
+            branches[-1] = [taken, branches[-1][1] or taken]
+            continue
+        if re.match(r"\} else \{$", line):
+            enclosing = all(active for active, _ in branches[:-1])
+            branches[-1] = [enclosing and not branches[-1][1], True]
+            continue
+        if line == "}":
+            branches.pop()
+            continue
+        if not enclosing:
+            continue
+        command, _, args = line.partition(" ")
+        if command == "set":
+            name, _, value = args.strip().partition(" ")
+            variables[name] = substitute(unquote(value), variables)
+        elif not fake_step(command, args, variables):
+            return 1, f"{command} failed"
+    return 0, ""
+
+
+def fake_session_main():
+    global fake_csim_command
+    parser = argparse.ArgumentParser(description="Fake HLS TCL session reading commands from stdin")
+    parser.add_argument("--fake-session", action="store_true")
+    parser.add_argument("--csim", default=fake_csim_command, help="command run for csim_design/cosim_design, argv appended")
+    parser.add_argument("--startup", type=float, default=fake_startup_delay, help="seconds slept before the session is ready")
+    args = parser.parse_args()
+    fake_csim_command = args.csim
+    time.sleep(args.startup)
+    print("INFO: [HLS 200-10] Running fake HLS session")
+    variables = {}
+    for line in sys.stdin:
+        line = line.strip()
+        match = re.match(r"cd \{(.*)\}$", line)
+        if match:
+            os.chdir(match.group(1))
+            continue
+        match = re.match(r"set (\w+) \[catch \{source \{(.*)\}\} (\w+)\]$", line)
+        if match:
+            rc, message = fake_source(match.group(2), variables)
+            variables[match.group(1)], variables[match.group(3)] = str(rc), message
+            continue
+        match = re.match(r"if \{\$(\w+)\} \{puts \"(.*)\"\}$", line)
+        if match:
+            if variables.get(match.group(1), "0") != "0":
+                print(substitute(match.group(2), variables))
+            continue
+        match = re.match(r'puts "(.*)"$', line)
+        if match:
+            print(substitute(match.group(1), variables))
+        elif line == "flush stdout":
+            sys.stdout.flush()
+        elif line in ("exit", "quit"):
+            break
+
+
+if __name__ == "__main__":
+    if "--fake-session" in sys.argv[1:]:
+        fake_session_main()
+    else:
+        print("Usage: python3 hls_worker.py --fake-session")
+        sys.exit(1)
@@ -1,5 +1,5 @@
 import os
-import openai
+import llm
 
 #  Configurations
 base_path = ".../hlsollm_modal"
@@ -46,17 +46,12 @@ def extract_code_from_response(response):
 
 
 def instrument_code(modules, variables, code_content, template_content):
-    client = openai.OpenAI()
     prompt = (f"Given the code for a kernel test bench and lists of key variables, instrument the following testbench code and save the key variables spectra in .txt files.\n\n"
               f"The sensitive variables are: \n{', '.join(variables)}.\n\n"
               f"The code to be instrumented is as follows:\n{code_content}\n\n"
               f"You can refer to the instrumentation template. Please note that you do not refer to the specific code logic below, but only refer to the instrumentation method and file saving method::\n{template_content}\n\n")
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    response_text = response.choices[0].message.content
+    response_text = llm.chat(model="gpt-4o", messages=[{"role": "user", "content": prompt}])
 
     #  Save prompt and response
     write_file_content(os.path.join(instrument_folder, f"prompt.txt"), prompt)
@@ -0,0 +1,286 @@
+import os
+import json
+import time
+import fcntl
+import random
+import hashlib
+import threading
+from contextlib import contextmanager
+
+# LLM backend used by testing.py, tb_gene.py, rea.py and instrument.py:
+#   "openai"  the OpenAI API (OPENAI_API_KEY, OPENAI_BASE_URL as usual)
+#   "local"   the OpenAI-compatible stand-in of llm_server.py at local_base_url
+# Further backends can be added with register_backend.
+backend = os.environ.get("HLSOLLM_LLM_BACKEND", "openai")
+local_base_url = os.environ.get("HLSOLLM_LLM_URL", "http://127.0.0.1:8765/v1")
+
+# When set, every exchange is appended to this JSONL file; llm_server.py --recordings serves it back
+record_file = os.environ.get("HLSOLLM_LLM_RECORD")
+record_lock = threading.Lock()
+
+# Content-addressed response cache shared by all scripts and instances on the machine, bounded to cache_max_bytes
+# by evicting the least recently used entries. HLSOLLM_LLM_CACHE=0 disables it. Callers that need a new answer every
+# time (test vector generation, testbench repair rounds, rea.py step 2 and its later rounds) pass cache=False.
+cache_enabled = os.environ.get("HLSOLLM_LLM_CACHE", "1") != "0"
+cache_dir = os.environ.get("HLSOLLM_LLM_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "hlsollm", "llm"))
+cache_max_bytes = int(os.environ.get("HLSOLLM_LLM_CACHE_BYTES", 256 * 1024 * 1024))
+cache_lock = threading.Lock()
+cache_bytes = None  # Size of the cache directory, scanned on first write and kept up to date by this process
+
+# Limits shared by every process of the machine (parallel run.py instances, testing.py, rea.py) through lock files
+# in limits_dir: at most max_concurrency requests in flight, and a token bucket of requests_per_minute with burst
+# capacity. Failed requests that may succeed later (rate limits, timeouts, connection and server errors) are retried
+# up to max_retries times with jittered exponential backoff.
+limits_dir = os.environ.get("HLSOLLM_LLM_LIMITS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "hlsollm", "limits"))
+max_concurrency = int(os.environ.get("HLSOLLM_LLM_CONCURRENCY", 8))
+requests_per_minute = float(os.environ.get("HLSOLLM_LLM_RPM", 500))  # 0 disables the rate limit
+burst = int(os.environ.get("HLSOLLM_LLM_BURST", 10))
+max_retries = int(os.environ.get("HLSOLLM_LLM_RETRIES", 6))
+retry_base_delay = 1.0
+retry_max_delay = 60.0
+request_timeout = float(os.environ.get("HLSOLLM_LLM_TIMEOUT", 300))
+max_connections = 16
+
+# One pooled client per backend for the whole process
+clients = {}
+clients_lock = threading.Lock()
+
+# Own generator for retry jitter, so retries never shift the campaign's random sequence
+retry_rng = random.Random()
+
+
+def request_key(model, messages, params=None):
+    """Key of a chat request, shared with llm_server.py to look up recorded responses"""
+    request = {"model": model, "messages": messages}
+    if params:
+        request["params"] = params
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def cache_path(key):
+    #  One subtree per backend, so stand-in responses are never served to real runs
+    return os.path.join(cache_dir, backend, key[:2], f"{key}.json")
+
+
+def cache_get(key):
+    path = cache_path(key)
+    try:
+        with open(path, 'r') as f:
+            response_text = json.load(f)["response"]
+    except (OSError, ValueError, KeyError):
+        return None
+    #  The modification time orders entries for eviction, so a hit makes an entry the most recent
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return response_text
+
+
+def cache_entries():
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for fname in files:
+            path = os.path.join(root, fname)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def evict(limit):
+    """Delete least recently used entries until the cache holds at most limit bytes; returns the remaining size"""
+    entries = sorted(cache_entries())
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+    return total
+
+
+def cache_put(key, model, response_text):
+    global cache_bytes
+    path = cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"model": model, "response": response_text}, f, ensure_ascii=False)
+    size = os.path.getsize(tmp_path)
+    os.replace(tmp_path, path)
+
+    with cache_lock:
+        if cache_bytes is None:
+            cache_bytes = sum(size for _, size, _ in cache_entries())
+        else:
+            cache_bytes += size
+        #  Other processes write to the same directory, so eviction recounts from disk; it leaves some headroom
+        #  so that the next writes do not trigger another scan right away
+        if cache_bytes > cache_max_bytes:
+            cache_bytes = evict(cache_max_bytes * 9 // 10)
+
+
+def shared_client(name, **kwargs):
+    """
+    OpenAI client of a backend, created once per process and reused by every call and thread, so connections
+    (and their TLS sessions) stay open in the pool. Retries are done by chat(), not by the client.
+    """
+    with clients_lock:
+        if name not in clients:
+            import httpx
+            import openai
+            http_client = openai.DefaultHttpxClient(
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            )
+            clients[name] = openai.OpenAI(max_retries=0, timeout=request_timeout, http_client=http_client, **kwargs)
+        return clients[name]
+
+
+def openai_chat(model, messages, **params):
+    client = shared_client("openai")
+    response = client.chat.completions.create(model=model, messages=messages, **params)
+    return response.choices[0].message.content
+
+
+def local_chat(model, messages, **params):
+    client = shared_client("local", base_url=local_base_url, api_key="local")
+    response = client.chat.completions.create(model=model, messages=messages, **params)
+    return response.choices[0].message.content
+
+
+backends = {"openai": openai_chat, "local": local_chat}
+
+
+def register_backend(name, chat_func):
+    """Make chat_func(model, messages, **params) -> response text selectable as backend name"""
+    backends[name] = chat_func
+
+
+def record(model, messages, response_text):
+    if not record_file:
+        return
+    entry = {"key": request_key(model, messages), "model": model, "messages": messages, "response": response_text}
+    with record_lock:
+        with open(record_file, 'a') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+@contextmanager
+def request_slot():
+    """Hold one of the max_concurrency machine-wide request slots (an flock on limits_dir/slot_<i>.lock)"""
+    os.makedirs(limits_dir, exist_ok=True)
+    while True:
+        for slot in range(max_concurrency):
+            f = open(os.path.join(limits_dir, f"slot_{slot}.lock"), 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+            return
+        time.sleep(0.05 + retry_rng.random() * 0.1)
+
+
+def take_rate_token():
+    """Wait for a token of the machine-wide bucket (state in limits_dir/bucket.json, guarded by bucket.lock)"""
+    if requests_per_minute <= 0:
+        return
+    os.makedirs(limits_dir, exist_ok=True)
+    rate = requests_per_minute / 60.0
+    state_file = os.path.join(limits_dir, "bucket.json")
+    while True:
+        with open(os.path.join(limits_dir, "bucket.lock"), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            now = time.time()
+            try:
+                with open(state_file, 'r') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {"tokens": float(burst), "time": now}
+            tokens = min(float(burst), state["tokens"] + (now - state["time"]) * rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            with open(state_file, 'w') as f:
+                json.dump({"tokens": tokens, "time": now}, f)
+        if not wait:
+            return
+        time.sleep(wait)
+
+
+def retry_delay(attempt, error):
+    """Backoff before retry number attempt (from 0): the server's Retry-After when given, else capped exponential with jitter"""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(retry_max_delay, float(retry_after))
+        except ValueError:
+            pass
+    delay = min(retry_max_delay, retry_base_delay * 2 ** attempt)
+    return delay / 2 + retry_rng.uniform(0, delay / 2)
+
+
+def retryable(error):
+    """Errors after which the same request may succeed: rate limits, timeouts, connection and server errors"""
+    try:
+        import openai
+    except ImportError:
+        openai = None
+    if openai is not None:
+        if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)):
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def limited_call(chat_func, model, messages, **params):
+    """Call a backend within the concurrency and rate limits, retrying transient failures"""
+    for attempt in range(max_retries + 1):
+        take_rate_token()
+        try:
+            with request_slot():
+                return chat_func(model, messages, **params)
+        except Exception as e:
+            if attempt == max_retries or not retryable(e):
+                raise
+            delay = retry_delay(attempt, e)
+            print(f"LLM request failed ({type(e).__name__}: {e}), retry {attempt + 1}/{max_retries} in {delay:.1f} s")
+            time.sleep(delay)
+
+
+def chat(model, messages, cache=True, **params):
+    """
+    Send a chat completion request to the configured backend.
+    :param messages: OpenAI-style list of {"role", "content"}
+    :param cache: Serve and store the response in the on-disk cache; pass False for calls that need a fresh sample
+    :param params: Extra sampling parameters (temperature, ...), part of the cache key
+    :return: Text of the first choice
+    """
+    if backend not in backends:
+        raise ValueError(f"Unknown LLM backend '{backend}', expected one of {', '.join(backends)}")
+    use_cache = cache and cache_enabled
+    if use_cache:
+        key = request_key(model, messages, params)
+        response_text = cache_get(key)
+        if response_text is not None:
+            return response_text
+
+    response_text = limited_call(backends[backend], model, messages, **params)
+    record(model, messages, response_text)
+    if use_cache:
+        cache_put(key, model, response_text)
+    return response_text
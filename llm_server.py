@@ -0,0 +1,170 @@
+import re
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import llm
+
+# Local, deterministic stand-in for the OpenAI chat completions API (POST /v1/chat/completions).
+# A request is answered, in this order, by:
+#   1. a recorded response with the same model and messages (JSONL written through HLSOLLM_LLM_RECORD)
+#   2. rule-based test vector generation when the prompt carries an example test vector block
+#   3. the first code block of the prompt returned unchanged as ```cpp (testbench repair and instrumentation prompts)
+# Start it with `python3 llm_server.py` and set HLSOLLM_LLM_BACKEND=local for the scripts.
+default_host = "127.0.0.1"
+default_port = 8765
+
+# Share of generated values taken from boundary values instead of the example's range
+boundary_ratio = 0.1
+boundary_values = [0, -1, 1, 2**7 - 1, -2**7, 2**15 - 1, -2**15, 2**16 - 1, 2**31 - 1, -2**31]
+
+code_block = re.compile(r"```[^\n]*\n(.*?)```", re.S)
+vector_count = re.compile(r"Generate (\d+) new test vectors")
+
+
+def load_recordings(paths):
+    recordings = {}
+    for path in paths:
+        with open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    recordings[entry["key"]] = entry["response"]
+    return recordings
+
+
+def example_vectors(text):
+    """Last code block of text in which every line is whitespace-separated integers, as lists of ints"""
+    for block in reversed(code_block.findall(text)):
+        rows = [line.split() for line in block.strip().splitlines() if line.strip()]
+        try:
+            return [[int(token) for token in row] for row in rows] if rows else None
+        except ValueError:
+            continue
+    return None
+
+
+def generate_vectors(example, rng, count=None):
+    """
+    New vectors shaped like the example with values from its range and boundary values.
+    :param count: Number of vectors; by default one per example row, with the same number of columns
+    """
+    values = [value for row in example for value in row] or [0]
+    low, high = min(values), max(values)
+    if low == high:
+        low, high = low - 100, high + 100
+    shapes = example if count is None else [example[idx % len(example)] for idx in range(count)]
+    rows = []
+    for row in shapes:
+        rows.append(" ".join(
+            str(rng.choice(boundary_values) if rng.random() < boundary_ratio else rng.randint(low, high))
+            for _ in row
+        ))
+    return rows
+
+
+def respond(model, messages, recordings, seed):
+    key = llm.request_key(model, messages)
+    if key in recordings:
+        return recordings[key]
+
+    prompt = "\n".join(message.get("content", "") for message in messages if message.get("role") == "user")
+    example = example_vectors(prompt)
+    if example:
+        rng = random.Random(f"{seed}:{key}")
+        requested = vector_count.search(prompt)
+        count = int(requested.group(1)) if requested else None
+        return "```\n" + "\n".join(generate_vectors(example, rng, count)) + "\n```"
+
+    blocks = code_block.findall(prompt)
+    if blocks:
+        return "```cpp\n" + blocks[0].strip() + "\n```"
+    return "No recorded response for this request."
+
+
+def completion(model, content):
+    tokens = len(content.split())
+    return {
+        "id": f"chatcmpl-{hashlib.sha256(content.encode()).hexdigest()[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def make_handler(recordings, seed, latency, jitter):
+    class Handler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self.send_json(200, {"object": "list", "data": [{"id": "standin", "object": "model", "owned_by": "local"}]})
+            else:
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        def do_POST(self):
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                model, messages = request["model"], request["messages"]
+            except (ValueError, KeyError) as e:
+                self.send_json(400, {"error": {"message": f"Malformed request: {e}"}})
+                return
+            delay = latency + (random.uniform(0, jitter) if jitter else 0)
+            if delay:
+                time.sleep(delay)
+            self.send_json(200, completion(model, respond(model, messages, recordings, seed)))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(host=default_host, port=default_port, recordings=(), seed=0, latency=0.0, jitter=0.0):
+    """
+    Start the stand-in server in a background thread.
+    :param latency: Seconds added to every response
+    :param jitter: Upper bound of a random extra delay per response, in seconds
+    :return: The server; call shutdown() to stop it
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(load_recordings(recordings), seed, latency, jitter))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible LLM stand-in")
+    parser.add_argument("--host", default=default_host)
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--recordings", nargs="*", default=[], help="JSONL files written through HLSOLLM_LLM_RECORD")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the rule-based vector generation")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="upper bound of a random extra delay in seconds")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(load_recordings(args.recordings), args.seed, args.latency, args.jitter))
+    print(f"LLM stand-in listening on http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
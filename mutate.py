@@ -3,6 +3,10 @@ import copy
 import sys
 import os
 import re
+import json
+import numpy as np
+import spectra_store
+import rules
 
 # Static variable definition, used to select a variant type (represented as a string)
 enabled_mutations = "578"  
@@ -13,12 +17,21 @@ enabled_mutations = "578"
 seed_file = sys.argv[1]  
 output_file = sys.argv[2]  
 
-# Define files and directories
-base_dir = ".../hlsollm_modal"
+# Optional random seed handed down by testing.py so that a resumed campaign mutates reproducibly
+if len(sys.argv) > 4:
+    random.seed(int(sys.argv[4]))
+
+# Define files and directories (testing.py passes its own base directory through HLSOLLM_BASE_DIR)
+base_dir = os.environ.get("HLSOLLM_BASE_DIR", ".../hlsollm_modal")
 check_dir = os.path.join(base_dir, "check")
 spectre_dir = os.path.join(base_dir, "spectre")
 probability_file = os.path.join(check_dir, "probability.txt")
 mutation_log_file = os.path.join(check_dir, "mutation.txt")
+weights_file = os.path.join(check_dir, "mutation_weights.json")
+# With redundancy filtering the recorded spectra rows belong to the filtered copy of the seed file; testing.py then
+# passes the (first) line of the seed file of every row (0-based, one per line) through HLSOLLM_MUTATION_ROWS
+row_map_file = os.environ.get("HLSOLLM_MUTATION_ROWS")
+rule_spec_file = os.path.join(base_dir, "rules.json")
 
 # Create the required directory
 os.makedirs(check_dir, exist_ok=True)
@@ -188,10 +201,37 @@ enabled_mutation_funcs = [mutation_map[int(m)] for m in enabled_mutations if int
 mutation_weights = {func.__name__: 1 / len(enabled_mutation_funcs) for func in enabled_mutation_funcs}
 
 
+def load_mutation_weights():
+    """Continue from the weights saved by the previous round instead of restarting from equal weights"""
+    if not os.path.exists(weights_file):
+        return
+    with open(weights_file, 'r') as f:
+        saved = json.load(f)
+    # Only keep weights of the currently enabled mutations
+    if set(saved) == set(mutation_weights):
+        mutation_weights.update(saved)
+
+
+def save_mutation_weights():
+    tmp_file = weights_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(mutation_weights, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, weights_file)
+
+
 def read_seed_file():
     with open(seed_file, 'r') as f:
         return [[int(num) for num in line.strip().split()] for line in f]
 
+def read_row_map(seed_count):
+    """Seed line of every spectra row: the row map of testing.py when given, else one row per seed line"""
+    if not row_map_file:
+        return list(range(seed_count))
+    with open(row_map_file, 'r') as f:
+        return [int(line) for line in f if line.strip()]
+
 def write_mutated_file(data):
     with open(output_file, 'w') as f:
         for line in data:
@@ -268,38 +308,45 @@ def generate_mutations(seed_data, source_file, start_index=1):
 
 
 
-def check_priority_cases(current_round, mutation_tracking):
+def check_priority_cases(spectra_round, mutation_tracking, row_map):
+    """
+    :param row_map: Seed line (0-based) of every spectra row of the round, see read_row_map
+    """
     priority_cases = {}  
     priority_spec_info = []
 
-    for fname in ["input_a_sp.txt", "input_b_sp.txt", "add_result_sp.txt", "subtract_result_sp.txt", "divide_sp.txt", "multiply_sp.txt", "bitwise_and_sp.txt", "bitwise_or_sp.txt",  "bitwise_xor_sp.txt", "mod_result_sp.txt"]:
-        path = os.path.join(spectre_dir, fname)
-        
-        # Check if the file exists
-        if not os.path.exists(path):
-            print(f"Warning: {path} not found. Skipping this file.")
+    for entry in rules.compile_rules(rules.load_rule_spec(rule_spec_file)):
+        variable = entry["variable"]
+
+        # The running statistics hold the global maximum and minimum, so only the current round's values are read
+        stats = spectra_store.load_stats(spectre_dir, variable)
+        if not stats["count"]:
+            print(f"Warning: no values of {variable} in {spectre_dir}. Skipping this variable.")
             continue
-        
-        # Read all values ​​of the current round file and find the global maximum
-        with open(path, 'r') as file:
-            lines = [float(line.split()[1]) for line in file.readlines()]
-        
-        # Make sure that the index of mutation_tracking is not out of range
-        min_length = min(len(lines), len(mutation_tracking))
-        
-        # Determine priority test cases and record maximum or minimum values
-        max_val, min_val = max(lines), min(lines)
-        for idx, val in enumerate(lines[:min_length]):
-            if val == max_val or val == min_val:
-                test_vector_id = idx + 1  
-                variable = fname.split('_')[0] 
-                mutation_type = mutation_tracking[idx][1]  
-                status = "Max" if val == max_val else "Min"
-
-                # Update priority test cases
-                if test_vector_id not in priority_cases:
-                    priority_cases[test_vector_id] = []
-                priority_cases[test_vector_id].append((variable, status, mutation_type))
+        if stats["last_round"] != spectra_round:
+            print(f"Warning: no values of {variable} recorded in round {spectra_round}. Skipping this variable.")
+            continue
+        values = spectra_store.load_round(spectre_dir, variable, stats)
+
+        # Make sure that the index of row_map is not out of range
+        min_length = min(len(values), len(row_map))
+
+        # Determine priority test cases: vectors of this round that reach the global maximum or minimum
+        max_val, min_val = stats["max"], stats["min"]
+        head = values[:min_length]
+        max_rows, min_rows = np.flatnonzero(head == max_val), np.flatnonzero(head == min_val)
+        for idx in np.union1d(max_rows, min_rows).tolist():
+            seed_index = row_map[idx]
+            if seed_index >= len(mutation_tracking):
+                continue
+            test_vector_id = seed_index + 1
+            mutation_type = mutation_tracking[seed_index][1]
+            status = "Max" if values[idx] == max_val else "Min"
+
+            # Update priority test cases
+            if test_vector_id not in priority_cases:
+                priority_cases[test_vector_id] = []
+            priority_cases[test_vector_id].append((variable, status, mutation_type))
 
     # Organize the details of priority test cases
     for test_vector_id, details in priority_cases.items():
@@ -402,8 +449,9 @@ def main():
     priority_file = os.path.join(check_dir, f"priority_{current_round}.txt")
     priority_spec_file = os.path.join(check_dir, f"priority_{current_round}_spec.txt")
 
-    # Initialize the mutation number
+    # Initialize the mutation number and weights
     initialize_mutation_index()
+    load_mutation_weights()
 
     # Read seed file data
     seed_data = read_seed_file()
@@ -415,7 +463,10 @@ def main():
     write_mutated_file(mutated_data)
 
     # Check priority test cases and their specification information
-    priority_cases, priority_spec_info = check_priority_cases(current_round, mutation_tracking)
+    # The seed file is the .dat file of the round whose spectra testing.py just recorded
+    priority_cases, priority_spec_info = check_priority_cases(
+        extract_round_number(seed_file), mutation_tracking, read_row_map(len(seed_data))
+    )
 
     # Save priority test case information to file
     with open(priority_file, 'w') as f:
@@ -439,6 +490,7 @@ def main():
 
     # Output updated mutation weight
     print(f"Updated Mutation Weights: {mutation_weights}")
+    save_mutation_weights()
 
     # Save the mutation weight to the file
     with open(probability_file, 'a') as f:
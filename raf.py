@@ -0,0 +1,170 @@
+import os
+import hashlib
+import threading
+import numpy as np
+
+# Each round's vectors are normalized and fingerprinted against a persistent index of the vectors already simulated;
+# exact repeats, and optionally vectors with an already simulated equivalence key, are dropped before the C++ and
+# HLS runs. testing.py writes the position of every kept vector to <N>_raf_rows.txt, which mutate.py uses to relate
+# the HLS spectra rows to its seed lines.
+
+# Serializes updates of the in-memory index and its file
+index_lock = threading.Lock()
+
+
+def normalize_vector(line):
+    """
+    Canonical text of a test vector: single spaces between tokens, integers without sign or leading-zero noise,
+    floats in Python's repr. Tokens that are not numbers are kept as they are.
+    """
+    tokens = []
+    for token in line.split():
+        try:
+            tokens.append(str(int(token)))
+        except ValueError:
+            try:
+                tokens.append(repr(float(token)))
+            except ValueError:
+                tokens.append(token)
+    return " ".join(tokens)
+
+
+def fingerprint(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()[:32]
+
+
+def load_index(index_file):
+    """
+    Load the persistent fingerprint index: one "<namespace>:<fingerprint>" per line, appended after each simulated round.
+    :return: Set of index keys
+    """
+    index = set()
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as f:
+            for line in f:
+                key = line.strip()
+                if key:
+                    index.add(key)
+    return index
+
+
+def split_vectors(lines, lines_per_vector=1):
+    """
+    Group the non-empty lines of a .dat file into test vectors of lines_per_vector lines, the way the testbench reads
+    them (a shorter last group is a vector of its own).
+    :return: (text of every vector, positions in lines of every vector's lines)
+    """
+    filled = [position for position, line in enumerate(lines) if line.strip()]
+    positions = [filled[start:start + lines_per_vector] for start in range(0, len(filled), lines_per_vector)]
+    vectors = ["".join(lines[position] if lines[position].endswith("\n") else lines[position] + "\n" for position in group) for group in positions]
+    return vectors, positions
+
+
+def filter_vectors(lines, index, equivalence_key=None, keep_positions=()):
+    """
+    Drop vectors that were already simulated, either exactly (after normalization) or, when equivalence_key is given,
+    because an equivalent vector was. Repeats inside lines are dropped as well.
+    :param lines: Test vectors, one per entry (several .dat lines each when split_vectors grouped them)
+    :param index: Set returned by load_index
+    :param equivalence_key: Optional callable (position, line) -> key text or bytes, or None when the vector has no equivalence class
+    :param keep_positions: Positions that are never dropped for equivalence only (their keys are still recorded)
+    :return: (positions of the kept vectors, index keys of the kept vectors, number of dropped vectors)
+    """
+    kept = []
+    new_keys = []
+    seen = set()
+    dropped = 0
+
+    for position, line in enumerate(lines):
+        normalized = normalize_vector(line)
+        if not normalized:
+            continue
+        exact = f"exact:{fingerprint(normalized)}"
+        keys = [exact]
+        if equivalence_key is not None:
+            equivalent = equivalence_key(position, line)
+            if equivalent is not None:
+                keys.append(f"equiv:{fingerprint(equivalent)}")
+
+        if position in keep_positions:
+            duplicate = exact in index or exact in seen
+        else:
+            duplicate = any(key in index or key in seen for key in keys)
+        if duplicate:
+            dropped += 1
+            continue
+        seen.update(keys)
+        new_keys.extend(keys)
+        kept.append(position)
+
+    return kept, new_keys, dropped
+
+
+def spectra_signatures(columns, quantum=1.0):
+    """
+    Signature of every row across a set of spectra: the row's values quantized to multiples of quantum.
+    :param columns: One array per variable, all of the same length
+    :return: One bytes signature per row
+    """
+    with np.errstate(invalid='ignore'):
+        quantized = np.floor(np.column_stack(columns) / quantum)
+    return [row.tobytes() for row in quantized]
+
+
+def boundary_rows(columns, names, extremes, limits=()):
+    """
+    Rows that extend a variable beyond the extremes seen so far or hit one of the given limit values.
+    :param columns: One array per variable, all of the same length
+    :param names: Variable name of each column, used as key of extremes
+    :param extremes: {name: (min, max)} updated in place
+    :param limits: Values that always count as boundary hits (e.g. integer type limits)
+    :return: Set of row indices
+    """
+    rows = set()
+    for name, values in zip(names, columns):
+        if not values.size or np.isnan(values).all():
+            continue
+        if limits:
+            rows.update(np.flatnonzero(np.isin(values, limits)).tolist())
+        round_min, round_max = np.nanmin(values), np.nanmax(values)
+        seen_min, seen_max = extremes.get(name, (None, None))
+        if seen_min is None or round_min < seen_min:
+            rows.update(np.flatnonzero(values == round_min).tolist())
+            seen_min = round_min
+        if seen_max is None or round_max > seen_max:
+            rows.update(np.flatnonzero(values == round_max).tolist())
+            seen_max = round_max
+        extremes[name] = (seen_min, seen_max)
+    return rows
+
+
+def filter_dat_file(dat_file, output_file, index, equivalence_key=None, lines_per_vector=1):
+    """
+    Write the vectors of dat_file that still need a hardware simulation to output_file.
+    The index is not updated here; call commit_keys once the kept vectors have been simulated.
+    :param lines_per_vector: .dat lines the testbench reads per vector; a vector is kept or dropped as a whole
+    :return: (index keys of the kept vectors, position in dat_file of the first line of every kept vector, number dropped)
+    """
+    with open(dat_file, 'r') as f:
+        lines = f.readlines()
+    vectors, positions = split_vectors(lines, lines_per_vector)
+    with index_lock:
+        kept, new_keys, dropped = filter_vectors(vectors, index, equivalence_key)
+    with open(output_file, 'w') as f:
+        f.writelines(vectors[pos] for pos in kept)
+    return new_keys, [positions[pos][0] for pos in kept], dropped
+
+
+def commit_keys(index_file, index, keys):
+    """Record simulated vectors in the index and append them to its file so they stay filtered after a restart"""
+    if not keys:
+        return
+    with index_lock:
+        new_keys = [key for key in keys if key not in index]
+        with open(index_file, 'a') as f:
+            f.writelines(f"{key}\n" for key in new_keys)
+            f.flush()
+            os.fsync(f.fileno())
+        index.update(new_keys)
@@ -1,5 +1,5 @@
 import os
-import openai
+import llm
 
 # File configuration
 base_path = ".../hlsollm"
@@ -39,8 +39,7 @@ def generate_prompt(step, previous_analysis, extra_file_path=None):
     return prompt
 
 # Query GPT function clearly structured
-def query_gpt(prompt, image_path=None, common=None):
-    client = openai.OpenAI()
+def query_gpt(prompt, image_path=None, common=None, cache=True):
     system_message = "You are a helpful assistant for detecting discrepancies between C and HLS programs."
 
     if common:
@@ -51,12 +50,7 @@ def query_gpt(prompt, image_path=None, common=None):
         {"role": "user", "content": prompt}
     ]
 
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages
-    )
-
-    return response.choices[0].message.content
+    return llm.chat(model="gpt-4o", messages=messages, cache=cache)
 
 # History saving clearly separated for maintainability
 def save_history(round_number, step, prompt, response):
@@ -79,22 +73,25 @@ def main():
     for round_number in range(1, rounds + 1):
         print(f"\n--- Starting Analysis Round {round_number} ---")
         analysis_history = ""
+        # Later rounds send the same prompts again for a new answer, so only the first round may be served from the cache
+        cache = round_number == 1
 
         # Step 1: Code analysis
         prompt1 = generate_prompt(1, analysis_history)
-        response1 = query_gpt(prompt1, common=common_discrepancies)
+        response1 = query_gpt(prompt1, common=common_discrepancies, cache=cache)
         save_history(round_number, 1, prompt1, response1)
         analysis_history += f"Code Analysis:\n{response1}\n\n"
 
         # Step 2: Statement analysis
         prompt2 = generate_prompt(2, analysis_history)
-        response2 = query_gpt(prompt2, common=common_discrepancies)
+        # The step 2 prompt carries no program text, so a cached answer could belong to another kernel
+        response2 = query_gpt(prompt2, common=common_discrepancies, cache=False)
         save_history(round_number, 2, prompt2, response2)
         analysis_history += f"Statement Analysis:\n{response2}\n\n"
 
         # Step 3: Directive analysis
         prompt3 = generate_prompt(3, analysis_history)
-        response3 = query_gpt(prompt3, common=common_discrepancies)
+        response3 = query_gpt(prompt3, common=common_discrepancies, cache=cache)
         save_history(round_number, 3, prompt3, response3)
 
         print(f"--- Completed Analysis Round {round_number} ---")
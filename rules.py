@@ -0,0 +1,82 @@
+import json
+import os
+import numpy as np
+import spectra
+
+# Predicates a rule can name; each receives the CPU and HLS spectra arrays and returns a boolean mask
+predicates = {
+    "magnitude_loss": lambda c, h: np.abs(h) < np.abs(c),   #  Overflow / truncation: HLS lost magnitude
+    "hls_zero": lambda c, h: h == 0,                        #  HLS produced zero (e.g. a zero divisor)
+    "sign_flip": lambda c, h: np.sign(c) != np.sign(h),     #  Wrap-around changed the sign
+    "mismatch": spectra.mismatch_mask,                      #  Any difference
+}
+
+# Rules of the automatic gain control kernel (source/gc on the CPU side), used when no spec file is given. Example
+# specs ship as rules.json in source/bfs, dfs, ga and gc.
+default_rules = [
+    {"variable": "input_a", "cpu_file": "a.txt", "hls_file": "input_a.txt", "predicate": "magnitude_loss", "error": "input_a truncation"},
+    {"variable": "input_b", "cpu_file": "b.txt", "hls_file": "input_b.txt", "predicate": "magnitude_loss", "error": "input_b truncation"},
+    {"variable": "add_result", "cpu_file": "a+b.txt", "hls_file": "add_result.txt", "predicate": "magnitude_loss", "error": "add_result overflow"},
+    {"variable": "subtract_result", "cpu_file": "a-b.txt", "hls_file": "subtract_result.txt", "predicate": "hls_zero", "error": "divide by zero error"},
+    {"variable": "divide", "cpu_file": "divideResult.txt", "hls_file": "divide.txt", "predicate": "magnitude_loss", "error": "divide error"},
+    {"variable": "multiply", "cpu_file": "multiplyResult.txt", "hls_file": "multiply.txt", "predicate": "magnitude_loss", "error": "multiply_result overflow"},
+    {"variable": "bitwise_and", "cpu_file": "a&b.txt", "hls_file": "bitwise_and.txt", "predicate": "magnitude_loss", "error": "bitwise_and error"},
+    {"variable": "bitwise_or", "cpu_file": "a|b.txt", "hls_file": "bitwise_or.txt", "predicate": "magnitude_loss", "error": "bitwise_or error"},
+    {"variable": "bitwise_xor", "cpu_file": "a^b.txt", "hls_file": "bitwise_xor.txt", "predicate": "magnitude_loss", "error": "bitwise_xor error"},
+    {"variable": "mod_result", "cpu_file": "a%b.txt", "hls_file": "mod_result.txt", "predicate": "magnitude_loss", "error": "mod_result error"},
+]
+
+
+def load_rule_spec(spec_file):
+    """
+    Load the rule spec of a kernel: a JSON list of rules with variable, cpu_file, hls_file and optionally
+    predicate, error and diff_file. Falls back to default_rules when the file does not exist.
+    """
+    if spec_file and os.path.exists(spec_file):
+        with open(spec_file, 'r') as f:
+            return json.load(f)
+    return default_rules
+
+
+def compile_rules(rule_spec):
+    """
+    Compile a rule spec into a dispatch table with one entry per variable, so every spectrum is read once
+    and all of its rules are evaluated together.
+    :return: List of {"variable", "cpu_file", "hls_file", "diff_file", "checks": [(predicate, error_type)]}
+    """
+    table = {}
+    for rule in rule_spec:
+        missing = [key for key in ("variable", "cpu_file", "hls_file") if key not in rule]
+        if missing:
+            raise ValueError(f"Rule {rule} is missing {', '.join(missing)}")
+
+        variable = rule["variable"]
+        if variable not in table:
+            table[variable] = {
+                "variable": variable,
+                "cpu_file": rule["cpu_file"],
+                "hls_file": rule["hls_file"],
+                "diff_file": rule.get("diff_file", f"{variable}_diff.txt"),
+                "checks": [],
+            }
+        entry = table[variable]
+        if (entry["cpu_file"], entry["hls_file"]) != (rule["cpu_file"], rule["hls_file"]):
+            raise ValueError(f"Conflicting spectra files for variable {variable}: {rule}")
+
+        if "predicate" in rule:
+            if rule["predicate"] not in predicates:
+                raise ValueError(f"Unknown predicate '{rule['predicate']}' in rule {rule}")
+            error_type = rule.get("error", f"{variable} {rule['predicate']}")
+            entry["checks"].append((predicates[rule["predicate"]], error_type))
+
+    return list(table.values())
+
+
+def error_type_names(rule_table):
+    """Error types of a compiled rule table, in spec order"""
+    names = []
+    for entry in rule_table:
+        for _, error_type in entry["checks"]:
+            if error_type not in names:
+                names.append(error_type)
+    return names
@@ -1,35 +1,154 @@
 import os
+import time
+import fcntl
 import shutil
+import hashlib
+import signal
 import subprocess
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Instances run side by side, at most max_parallel_instances at a time (size it to the Vitis licenses and CPU cores).
+# An instance running longer than instance_timeout seconds is killed with everything it started and counted as failed;
+# a failing instance never stops the others.
+max_parallel_instances = int(os.environ.get("HLSOLLM_RUN_PARALLEL", min(4, os.cpu_count() or 1)))
+instance_timeout = float(os.environ.get("HLSOLLM_RUN_TIMEOUT", 6 * 3600)) or None
+
+# Running tb_gene.py processes, killed when run.py itself is interrupted
+running = {}
+running_lock = threading.Lock()
+
+# Shared read-only base of the instances, under parent_dir:
+#   objects/<sha256>  one immutable (mode 0444) copy of every distinct input file, hardlinked into the instances
+#   synth/<key>/      synthesized solutions published by tb_gene.py and reused by every instance with the same kernel
+# The instance directory itself is the overlay: everything an instance generates is a new file of its own.
+base_dir_name = ".base"
+FICLONE = 0x40049409  # Linux ioctl cloning a file's extents (reflink) on btrfs, XFS and similar
+
+def reflink_or_copy(src_file, dest_file):
+    """Copy-on-write clone of src_file where the file system supports it, a plain copy otherwise"""
+    with open(src_file, 'rb') as src, open(dest_file, 'wb') as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass
+    shutil.copyfile(src_file, dest_file)
+
+def store_object(objects_dir, src_file):
+    """Add src_file to the content-addressed object store once and return the path of its read-only copy"""
+    digest = hashlib.sha256()
+    with open(src_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    object_file = os.path.join(objects_dir, digest.hexdigest())
+    if not os.path.exists(object_file):
+        os.makedirs(objects_dir, exist_ok=True)
+        tmp_file = f"{object_file}.{os.getpid()}.tmp"
+        reflink_or_copy(src_file, tmp_file)
+        os.chmod(tmp_file, 0o444)
+        os.replace(tmp_file, object_file)
+    return object_file
+
+def link_input(object_file, dest_file):
+    """Hardlink an object into an instance, falling back to a reflink or copy where hardlinks are not possible"""
+    if os.path.lexists(dest_file):
+        os.remove(dest_file)
+    try:
+        os.link(object_file, dest_file)
+    except OSError:
+        reflink_or_copy(object_file, dest_file)
 
 def create_folders_and_copy_files(source_dir, parent_dir, num_folders, all_files):
     """
-    Create E1_1 to E1_{num_folders} under parent_dir, copying files from source_dir.
-    No file content modification is performed.
+    Create E1_1 to E1_{num_folders} under parent_dir with the files of source_dir.
+    No file content modification is performed. Every file is snapshotted once into the shared base and hardlinked
+    into the instances, so an instance costs one directory entry per input instead of a full copy; the links are
+    read-only, and instances only ever create new files next to them.
     """
+    objects_dir = os.path.join(parent_dir, base_dir_name, "objects")
+    objects = {}
+    for filename in all_files:
+        src_file = os.path.join(source_dir, filename)
+        #  Link the file if it exists in source_dir
+        if os.path.isfile(src_file):
+            objects[filename] = store_object(objects_dir, src_file)
+        else:
+            print(f"Warning: {src_file} not found; skipping copy.")
+
     for i in range(1, num_folders + 1):
         instance_dir = os.path.join(parent_dir, f"E1_{i}")
         os.makedirs(instance_dir, exist_ok=True)
+        for filename, object_file in objects.items():
+            link_input(object_file, os.path.join(instance_dir, filename))
 
-        for filename in all_files:
-            src_file = os.path.join(source_dir, filename)
-            dest_file = os.path.join(instance_dir, filename)
-
-            #  Copy the file if it exists in source_dir
-            if os.path.isfile(src_file):
-                shutil.copy(src_file, dest_file)
-            else:
-                print(f"Warning: {src_file} not found; skipping copy.")
-
-def run_instance(instance_dir):
+def run_instance(instance_dir, timeout=None):
     """
-    cd to instance_dir and run 'python3 tb_gene.py'.
+    cd to instance_dir and run 'python3 tb_gene.py', with its output in tb_gene.log.
+    :return: (status, elapsed seconds) where status is "ok", "failed (exit code N)" or "timed out"
     """
-    cmd = "python3 tb_gene.py"
-    subprocess.run(cmd, shell=True, cwd=instance_dir, check=True)
+    start_time = time.time()
+    with open(os.path.join(instance_dir, "tb_gene.log"), 'w') as log:
+        #  Own process group, so a timeout can stop tb_gene.py with the simulators and the native builds it started.
+        #  Its Vitis sessions run in process groups of their own (see hls_worker.start_worker); kill_instance stops
+        #  those too. Instances of a batch share the synthesized solutions of identical kernels
+        env = dict(os.environ, HLSOLLM_SYNTH_CACHE=os.path.join(os.path.dirname(instance_dir), base_dir_name, "synth"))
+        process = subprocess.Popen(
+            ["python3", "tb_gene.py"], cwd=instance_dir, stdout=log, stderr=subprocess.STDOUT, start_new_session=True,
+            env=env,
+        )
+        with running_lock:
+            running[instance_dir] = process
+        try:
+            returncode = process.wait(timeout=timeout)
+            status = "ok" if returncode == 0 else f"failed (exit code {returncode})"
+        except subprocess.TimeoutExpired:
+            kill_instance(process)
+            status = "timed out"
+        finally:
+            with running_lock:
+                running.pop(instance_dir, None)
+    return status, time.time() - start_time
+
+def descendant_groups(pid):
+    """Process groups of every process descended from pid (read from /proc, so Linux only)"""
+    children = {}
+    groups = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                #  The command name in parentheses may contain spaces, the fields after it do not
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        groups[int(entry)] = int(fields[2])
+    found = set()
+    pending = [pid]
+    while pending:
+        for child in children.get(pending.pop(), []):
+            found.add(groups[child])
+            pending.append(child)
+    return found
 
-def update_final_file(instance_id, instance_dir, final_file):
+def kill_instance(process):
+    """Kill tb_gene.py with its process group and the process groups of its descendants (the Vitis sessions)"""
+    #  Collected first: once tb_gene.py is dead its sessions are reparented and can no longer be told apart
+    try:
+        groups = descendant_groups(process.pid)
+    except OSError:
+        groups = set()
+    for group in {process.pid} | groups:
+        try:
+            os.killpg(group, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+    process.wait()
+
+def update_final_file(instance_id, instance_dir, final_file, status="ok"):
     re_file = os.path.join(instance_dir, 're.txt')
     with open(final_file, 'a') as f_out:
         if os.path.exists(re_file):
@@ -38,6 +157,47 @@ def update_final_file(instance_id, instance_dir, final_file):
             f_out.write(f"E1_{instance_id}:\n{content}\n")
         else:
             f_out.write(f"E1_{instance_id}: re.txt not found.\n")
+        if status != "ok":
+            f_out.write(f"E1_{instance_id}: tb_gene.py {status}, see E1_{instance_id}/tb_gene.log\n")
+
+def summarize(parent_dir, finished, num_folders):
+    """Counts over the finished instances; instances without re.txt count as failed compilation and simulation"""
+    compilation_success = 0
+    compilation_failed = 0
+    simulation_success = 0
+    simulation_failed = 0
+
+    for i in finished:
+        instance_dir = os.path.join(parent_dir, f"E1_{i}")
+        re_file = os.path.join(instance_dir, 're.txt')
+        if os.path.exists(re_file):
+            with open(re_file, 'r') as f:
+                content = f.read()
+            if "Compilation successfully" in content:
+                compilation_success += 1
+            else:
+                compilation_failed += 1
+            if "Simulation successfully" in content:
+                simulation_success += 1
+            else:
+                simulation_failed += 1
+        else:
+            compilation_failed += 1
+            simulation_failed += 1
+
+    return (
+        f"\nSummary ({len(finished)} of {num_folders} instances finished):\n"
+        f"Compilation successfully: {compilation_success}\n"
+        f"Compilation failed: {compilation_failed}\n"
+        f"Simulation successfully: {simulation_success}\n"
+        f"Simulation failed: {simulation_failed}\n"
+    )
+
+def write_summary(summary_file, summary):
+    tmp_file = summary_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        f.write(summary)
+    os.replace(tmp_file, summary_file)
 
 def main():
     #  1) Hard-code the parent directory where your original files are located:
@@ -56,6 +216,8 @@ def main():
         "compile.py",
         "c_testbench.cpp",
         "tb_gene.py",
+        "llm.py",
+        "hls_worker.py",
         "emb.py",
         "1.dat"
     ]
@@ -66,7 +228,7 @@ def main():
     with open(final_output_file, 'w') as f:
         f.write("")
 
-    #  Create E1_1..E1_{num_folders} and copy files (no file modifications)
+    #  Create E1_1..E1_{num_folders} and link the files from the shared base (no file modifications)
     create_folders_and_copy_files(source_dir, parent_dir, num_folders, all_files)
 
     # Randomly select the number of instances with injected errors: Randomly select a number from {2,3,4}
@@ -83,44 +245,40 @@ def main():
         with open(inject_file, 'w') as f:
             f.write(injection_message)
 
-    #  Run each instance and update final.txt immediately after each run
-    for i in range(1, num_folders + 1):
-        instance_dir = os.path.join(parent_dir, f"E1_{i}")
-        print(f"Running instance: E1_{i}")
-        run_instance(instance_dir)
-        update_final_file(i, instance_dir, final_output_file)
-
-    # Summary of results for all instances (optional)
-    compilation_success = 0
-    compilation_failed = 0
-    simulation_success = 0
-    simulation_failed = 0
-
-    for i in range(1, num_folders + 1):
-        instance_dir = os.path.join(parent_dir, f"E1_{i}")
-        re_file = os.path.join(instance_dir, 're.txt')
-        if os.path.exists(re_file):
-            with open(re_file, 'r') as f:
-                content = f.read()
-            if "Compilation successfully" in content:
-                compilation_success += 1
-            else:
-                compilation_failed += 1
-            if "Simulation successfully" in content:
-                simulation_success += 1
-            else:
-                simulation_failed += 1
-        else:
-            compilation_failed += 1
-            simulation_failed += 1
+    #  Run the instances in parallel and update final.txt and summary.txt as soon as each one finishes
+    summary_file = os.path.join(parent_dir, "summary.txt")
+    finished = []
+    write_summary(summary_file, summarize(parent_dir, finished, num_folders))
+    print(f"Running {num_folders} instances, {max_parallel_instances} at a time")
+    executor = ThreadPoolExecutor(max_workers=max_parallel_instances)
+    futures = {}
+    try:
+        futures = {
+            executor.submit(run_instance, os.path.join(parent_dir, f"E1_{i}"), instance_timeout): i
+            for i in range(1, num_folders + 1)
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            instance_dir = os.path.join(parent_dir, f"E1_{i}")
+            try:
+                status, elapsed_time = future.result()
+            except Exception as e:
+                status, elapsed_time = f"failed ({type(e).__name__}: {e})", 0.0
+            print(f"Instance E1_{i} finished in {elapsed_time:.0f} seconds: {status}")
+            update_final_file(i, instance_dir, final_output_file, status)
+            finished.append(i)
+            write_summary(summary_file, summarize(parent_dir, finished, num_folders))
+    finally:
+        #  On an interrupt, drop the instances that have not started and kill the running ones
+        for future in futures:
+            future.cancel()
+        with running_lock:
+            processes = list(running.values())
+        for process in processes:
+            kill_instance(process)
+        executor.shutdown(wait=True)
 
-    summary = (
-        f"\nSummary:\n"
-        f"Compilation successfully: {compilation_success}\n"
-        f"Compilation failed: {compilation_failed}\n"
-        f"Simulation successfully: {simulation_success}\n"
-        f"Simulation failed: {simulation_failed}\n"
-    )
+    summary = summarize(parent_dir, sorted(finished), num_folders)
     with open(final_output_file, 'a') as f_out:
         f_out.write(summary)
     
@@ -0,0 +1,146 @@
+import os
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+# Timing of the stages of the testing loop (C++ compile/run, TCL generation, csim, csynth, cosim, diff, report,
+# mutation, LLM call): every finished span is one record (see span), and testing.py prints and saves the per-stage
+# summary when the campaign ends.
+
+# Serializes writes of span records and updates of the per-stage totals
+span_lock = threading.Lock()
+
+# Round of the calling thread, so nested helpers (builds, TCL runs) are attributed to the right round
+local = threading.local()
+
+# JSONL file receiving one record per finished span; None keeps the totals only
+spans_file = None
+
+# Per stage: {"count", "wall_s", "cpu_s", "child_cpu_s", "hls_cpu_s", "max_wall_s", "peak_rss_kb", "child_peak_rss_kb",
+# "hls_peak_rss_kb"}
+totals = {}
+
+
+def configure(path):
+    global spans_file
+    spans_file = path
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+
+@contextmanager
+def round_scope(round_id):
+    """Attribute the spans opened by this thread inside the block to round_id"""
+    previous = getattr(local, "round_id", None)
+    local.round_id = round_id
+    try:
+        yield
+    finally:
+        local.round_id = previous
+
+
+def current_round():
+    """Round of the calling thread, to hand over to helper threads"""
+    return getattr(local, "round_id", None)
+
+
+def annotate(**fields):
+    """Add fields to the innermost span open in the calling thread, e.g. the measurements of a helper run inside it"""
+    open_spans = getattr(local, "open_spans", None)
+    if open_spans:
+        open_spans[-1].update(fields)
+
+
+def child_cpu_time(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+@contextmanager
+def span(stage, **attrs):
+    """
+    Time a stage of the testing loop and record it.
+    wall_s is the elapsed time, cpu_s the CPU time of the calling thread and child_cpu_s the CPU time of the child
+    processes that finished inside the span (children reaped by other threads at the same time count too, so it is
+    exact only when stages do not overlap). Children that keep running, like the persistent HLS sessions, are not in
+    child_cpu_s: the TCL runs record the CPU time and peak RSS of their job as hls_cpu_s and hls_peak_rss_kb
+    (see testing.run_tcl_script). peak_rss_kb and child_peak_rss_kb are lifetime high-water marks, of this process
+    and of its largest reaped child since the process started, not of the span.
+    :param attrs: Extra fields of the record, e.g. the binary name or the number of vectors
+    """
+    start_time = time.time()
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    start_children = child_cpu_time(resource.getrusage(resource.RUSAGE_CHILDREN))
+    fields = dict(attrs)
+    if not hasattr(local, "open_spans"):
+        local.open_spans = []
+    local.open_spans.append(fields)
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        local.open_spans.pop()
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        record = {
+            "round": getattr(local, "round_id", None),
+            "stage": stage,
+            "start": round(start_time, 3),
+            "wall_s": round(time.perf_counter() - start_wall, 6),
+            "cpu_s": round(time.thread_time() - start_cpu, 6),
+            "child_cpu_s": round(child_cpu_time(children) - start_children, 6),
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "child_peak_rss_kb": children.ru_maxrss,
+        }
+        record.update(fields)
+        if error is not None:
+            record["error"] = error
+        emit(record)
+
+
+def emit(record):
+    with span_lock:
+        stage = totals.setdefault(record["stage"], {
+            "count": 0, "wall_s": 0.0, "cpu_s": 0.0, "child_cpu_s": 0.0, "hls_cpu_s": 0.0,
+            "max_wall_s": 0.0, "peak_rss_kb": 0, "child_peak_rss_kb": 0, "hls_peak_rss_kb": 0,
+        })
+        stage["count"] += 1
+        for key in ("wall_s", "cpu_s", "child_cpu_s"):
+            stage[key] += record[key]
+        stage["hls_cpu_s"] += record.get("hls_cpu_s", 0.0)
+        stage["hls_peak_rss_kb"] = max(stage["hls_peak_rss_kb"], record.get("hls_peak_rss_kb", 0))
+        stage["max_wall_s"] = max(stage["max_wall_s"], record["wall_s"])
+        stage["peak_rss_kb"] = max(stage["peak_rss_kb"], record["peak_rss_kb"])
+        stage["child_peak_rss_kb"] = max(stage["child_peak_rss_kb"], record["child_peak_rss_kb"])
+        if spans_file:
+            with open(spans_file, 'a') as f:
+                f.write(json.dumps(record) + "\n")
+
+
+def summary():
+    """Per-stage totals sorted by total wall time, longest first"""
+    with span_lock:
+        stages = {name: dict(stage) for name, stage in totals.items()}
+    for stage in stages.values():
+        stage["mean_wall_s"] = stage["wall_s"] / stage["count"]
+    return dict(sorted(stages.items(), key=lambda item: item[1]["wall_s"], reverse=True))
+
+
+def write_summary(summary_file=None):
+    """Print the per-stage summary and optionally save it as JSON"""
+    stages = summary()
+    if not stages:
+        return stages
+    print(f"{'stage':<14}{'count':>7}{'total s':>12}{'mean s':>10}{'max s':>10}{'cpu s':>10}{'child cpu s':>13}{'hls cpu s':>11}{'hls rss MB':>12}")
+    for name, stage in stages.items():
+        print(f"{name:<14}{stage['count']:>7}{stage['wall_s']:>12.2f}{stage['mean_wall_s']:>10.3f}{stage['max_wall_s']:>10.3f}"
+              f"{stage['cpu_s']:>10.2f}{stage['child_cpu_s']:>13.2f}{stage['hls_cpu_s']:>11.2f}{stage['hls_peak_rss_kb'] / 1024:>12.1f}")
+    if summary_file:
+        os.makedirs(os.path.dirname(summary_file), exist_ok=True)
+        with open(summary_file, 'w') as f:
+            json.dump(stages, f, indent=2)
+    return stages
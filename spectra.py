@@ -0,0 +1,74 @@
+import os
+import numpy as np
+
+
+def load_spectrum(source, column=-1):
+    """
+    Load one column of a whitespace-separated spectra file as a float64 array, one entry per row.
+    Rows whose value is not numeric become NaN, so every comparison on them is False.
+    :param source: Spectra file path or list of its lines
+    :param column: Column holding the value (the last one by default)
+    """
+    if isinstance(source, str):
+        if not os.path.exists(source) or os.path.getsize(source) == 0:
+            return np.empty(0)
+        with open(source, 'r') as f:
+            lines = f.readlines()
+    else:
+        lines = source
+    if not lines:
+        return np.empty(0)
+
+    #  Fast path: numpy's C parser, valid when every row has the same number of columns (loadtxt takes the column
+    #  position from the first row and would read another column of a wider row)
+    widths = {len(line.split()) for line in lines}
+    ncols = widths.pop() if len(widths) == 1 else 0
+    if ncols > 0:
+        usecol = column if column >= 0 else ncols + column
+        try:
+            values = np.loadtxt(lines, usecols=usecol, dtype=np.float64, ndmin=1, comments=None)
+            if len(values) == len(lines):
+                return values
+        except (ValueError, IndexError):
+            pass
+
+    #  Slow path for ragged or partly non-numeric files
+    values = np.full(len(lines), np.nan)
+    for idx, line in enumerate(lines):
+        parts = line.split()
+        try:
+            values[idx] = float(parts[column])
+        except (ValueError, IndexError):
+            continue
+    return values
+
+
+def mismatch_mask(cpp_values, hls_values):
+    """Rows where the HLS value differs from the CPU value (rows that are NaN on both sides match)"""
+    return (cpp_values != hls_values) & ~(np.isnan(cpp_values) & np.isnan(hls_values))
+
+
+def classify(cpp_values, hls_values, checks):
+    """
+    Apply every (condition, error_type) check to whole spectra at once.
+    Conditions receive the two arrays and return a boolean mask.
+    :return: {error_type: ascending indices of the rows that satisfy its condition}, so indices[0] is the first occurrence
+    """
+    flagged = {}
+    with np.errstate(invalid='ignore'):
+        for condition, error_type in checks:
+            indices = np.flatnonzero(condition(cpp_values, hls_values))
+            if indices.size:
+                flagged[error_type] = indices
+    return flagged
+
+
+def extreme_indices(values, limit=None):
+    """
+    Rows holding the maximum and the minimum of a spectrum.
+    :param limit: Only return rows below this index
+    :return: (max value, min value, indices of max rows, indices of min rows)
+    """
+    max_val, min_val = np.nanmax(values), np.nanmin(values)
+    head = values[:limit]
+    return max_val, min_val, np.flatnonzero(head == max_val), np.flatnonzero(head == min_val)
@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import numpy as np
+
+# Every variable of the store is a directory holding two append-only columns:
+#   values.f64  float64 value of each recorded row
+#   index.i32   int32 (round, vector) pair of each recorded row
+# and a running-statistics sidecar (stats.json) updated with every append: min/max and their rows, row count,
+# power-of-two histogram and a distinct-value sketch
+values_name = "values.f64"
+index_name = "index.i32"
+stats_name = "stats.json"
+
+# Number of smallest value hashes kept by the distinct-value sketch (k-minimum-values)
+sketch_size = 256
+
+
+def variable_dir(store_dir, variable):
+    return os.path.join(store_dir, variable)
+
+
+def append(store_dir, variable, round_id, values):
+    """
+    Append one round of a variable's spectrum in bulk.
+    :param values: Values of the round, one per vector, vectors numbered from 1
+    :return: Number of rows appended
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not values.size:
+        return 0
+    index = np.empty((values.size, 2), dtype=np.int32)
+    index[:, 0] = round_id
+    index[:, 1] = np.arange(1, values.size + 1)
+
+    directory = variable_dir(store_dir, variable)
+    os.makedirs(directory, exist_ok=True)
+    stats = load_stats(store_dir, variable)
+    #  Index last: a row only counts once both columns hold it
+    with open(os.path.join(directory, values_name), 'ab') as f:
+        f.write(values.tobytes())
+    with open(os.path.join(directory, index_name), 'ab') as f:
+        f.write(index.tobytes())
+    save_stats(store_dir, variable, update_stats(stats, round_id, values))
+    return values.size
+
+
+def row_count(store_dir, variable):
+    directory = variable_dir(store_dir, variable)
+    values_path = os.path.join(directory, values_name)
+    index_path = os.path.join(directory, index_name)
+    if not (os.path.exists(values_path) and os.path.exists(index_path)):
+        return 0
+    return min(os.path.getsize(values_path) // 8, os.path.getsize(index_path) // 8)
+
+
+def load(store_dir, variable):
+    """
+    Memory-map a variable's columns read-only, without parsing or copying.
+    :return: (values, index) where index[:, 0] is the round and index[:, 1] the vector of each row
+    """
+    count = row_count(store_dir, variable)
+    if count == 0:
+        return np.empty(0), np.empty((0, 2), dtype=np.int32)
+    directory = variable_dir(store_dir, variable)
+    values = np.memmap(os.path.join(directory, values_name), dtype=np.float64, mode='r', shape=(count,))
+    index = np.memmap(os.path.join(directory, index_name), dtype=np.int32, mode='r', shape=(count, 2))
+    return values, index
+
+
+def load_round(store_dir, variable, stats):
+    """Memory-mapped values of the last round recorded in stats, one per vector"""
+    values, _ = load(store_dir, variable)
+    return values[stats["last_start"]:stats["last_start"] + stats["last_count"]]
+
+
+def empty_stats():
+    return {
+        "rows": 0, "count": 0,
+        "min": None, "max": None, "argmin": None, "argmax": None,
+        "histogram": {},
+        "sketch": [],
+        "last_round": None, "last_start": 0, "last_count": 0,
+    }
+
+
+def value_hashes(values):
+    """64-bit hashes of float values (splitmix64 finalizer over their bits), equal values hash equally"""
+    bits = (values + 0.0).view(np.uint64)   #  + 0.0 folds -0.0 into 0.0
+    with np.errstate(over='ignore'):
+        h = bits ^ (bits >> np.uint64(30))
+        h = h * np.uint64(0xbf58476d1ce4e5b9)
+        h = h ^ (h >> np.uint64(27))
+        h = h * np.uint64(0x94d049bb133111eb)
+        return h ^ (h >> np.uint64(31))
+
+
+def histogram_buckets(values):
+    """
+    Counts per signed power-of-two bucket: "0" for zeros, "+e" / "-e" for values whose magnitude lies in [2^e, 2^(e+1)).
+    Infinite values fall into "+inf" / "-inf".
+    """
+    buckets = {}
+    zeros = int(np.count_nonzero(values == 0))
+    if zeros:
+        buckets["0"] = zeros
+    for sign, side in (("+", values[values > 0]), ("-", -values[values < 0])):
+        infinite = int(np.count_nonzero(np.isinf(side)))
+        if infinite:
+            buckets[f"{sign}inf"] = infinite
+        exponents, counts = np.unique(np.floor(np.log2(side[np.isfinite(side)])).astype(np.int64), return_counts=True)
+        for exponent, count in zip(exponents.tolist(), counts.tolist()):
+            buckets[f"{sign}{exponent}"] = count
+    return buckets
+
+
+def update_stats(stats, round_id, values):
+    """
+    Fold one appended round into the running statistics, touching only its values.
+    :param stats: Statistics covering the rows stored before the round
+    :return: Updated statistics
+    """
+    start = stats["rows"]
+    stats["rows"] = start + values.size
+    stats["last_round"], stats["last_start"], stats["last_count"] = round_id, start, values.size
+
+    valid = values[~np.isnan(values)]
+    if not valid.size:
+        return stats
+    stats["count"] += valid.size
+
+    round_min, round_max = np.nanmin(values), np.nanmax(values)
+    if stats["min"] is None or round_min < stats["min"]:
+        stats["min"], stats["argmin"] = float(round_min), start + int(np.nanargmin(values))
+    if stats["max"] is None or round_max > stats["max"]:
+        stats["max"], stats["argmax"] = float(round_max), start + int(np.nanargmax(values))
+
+    for bucket, count in histogram_buckets(valid).items():
+        stats["histogram"][bucket] = stats["histogram"].get(bucket, 0) + count
+
+    hashes = np.union1d(np.array(stats["sketch"], dtype=np.uint64), value_hashes(valid))
+    stats["sketch"] = hashes[:sketch_size].tolist()
+    return stats
+
+
+def distinct_estimate(stats):
+    """Estimated number of distinct values of a variable, exact below sketch_size distinct values"""
+    sketch = stats["sketch"]
+    if len(sketch) < sketch_size:
+        return len(sketch)
+    return int((sketch_size - 1) * 2.0 ** 64 / (sketch[-1] + 1))
+
+
+def rebuild_stats(store_dir, variable):
+    """Recompute the statistics of a variable from its columns, one round at a time"""
+    values, index = load(store_dir, variable)
+    stats = empty_stats()
+    if not values.size:
+        return stats
+    rounds = index[:, 0]
+    bounds = np.flatnonzero(rounds[1:] != rounds[:-1]) + 1
+    for start, end in zip([0] + bounds.tolist(), bounds.tolist() + [values.size]):
+        update_stats(stats, int(rounds[start]), np.asarray(values[start:end]))
+    return stats
+
+
+def load_stats(store_dir, variable):
+    """
+    Running statistics of a variable. They are rebuilt from the columns when they do not cover exactly the stored
+    rows, e.g. after a resumed campaign truncated the columns back to a checkpoint.
+    """
+    path = os.path.join(variable_dir(store_dir, variable), stats_name)
+    stats = None
+    if os.path.exists(path):
+        try:
+            with open(path, 'r') as f:
+                stats = json.load(f)
+        except json.JSONDecodeError:
+            stats = None
+    if stats is None or stats["rows"] != row_count(store_dir, variable):
+        stats = rebuild_stats(store_dir, variable)
+    return stats
+
+
+def save_stats(store_dir, variable, stats):
+    path = os.path.join(variable_dir(store_dir, variable), stats_name)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f)
+    os.replace(tmp_path, path)
+
+
+def variables(store_dir):
+    if not os.path.isdir(store_dir):
+        return []
+    return sorted(name for name in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, name)))
+
+
+def export_text(store_dir, variable, output_file):
+    """Write a variable as text rows "<line number> <round> <vector> <value>" for humans"""
+    values, index = load(store_dir, variable)
+    with open(output_file, 'w') as f:
+        for line_num, ((round_id, vector), value) in enumerate(zip(index.tolist(), values.tolist()), start=1):
+            f.write(f"{line_num} {round_id} {vector} {value:g}\n")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python3 spectra_store.py <store_dir> [variable] [output_file]")
+        sys.exit(1)
+    store_dir = sys.argv[1]
+    if len(sys.argv) < 3:
+        for variable in variables(store_dir):
+            stats = load_stats(store_dir, variable)
+            print(f"{variable}: {stats['rows']} rows, min {stats['min']}, max {stats['max']}, "
+                  f"~{distinct_estimate(stats)} distinct values")
+        return
+    variable = sys.argv[2]
+    output_file = sys.argv[3] if len(sys.argv) > 3 else f"{variable}_sp.txt"
+    export_text(store_dir, variable, output_file)
+    print(f"Exported {variable} to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,87 @@
 import subprocess
 import os
-import openai
+import llm
+import hls_worker
 import shutil
-import time
+import fcntl
+import hashlib
 import re
 import sys
+import json
 
 # --------------------------------------------------------------------------------------------------------------------------------
 # The directory where the current script is located is the instance directory
 base_dir = os.path.dirname(os.path.abspath(__file__))
 
-def create_vitis_tcl_script(kernel_path, testbench_path, extra_files, input_file_path, output_dir):
-    """Generate a TCL script running by Vitis HLS"""
-    tcl_script_path = os.path.join(base_dir, 'run_vitis.tcl')
+# Synthesized solutions shared by the instances of a run.py batch (run.py sets HLSOLLM_SYNTH_CACHE): the first instance
+# that synthesizes a kernel publishes its solution, and instances with an identical kernel clone it into p1 and only run
+# csim and cosim. Without the variable every instance synthesizes on its own.
+synth_cache_dir = os.environ.get("HLSOLLM_SYNTH_CACHE")
+FICLONE = 0x40049409
+
+# Pre-flight of every generated testbench before Vitis: `g++ -fsyntax-only`, then a native build with the HLS headers
+# run against 1.dat. Its diagnostics go straight back into the repair prompt, up to preflight_repairs times per
+# Vitis iteration, so most broken testbenches are fixed in seconds instead of a Vitis launch each. It is skipped when
+# no native compiler or HLS headers are found, or when the kernel alone does not compile natively.
+preflight = True
+preflight_compiler = "g++"
+preflight_flags = ["-std=c++14", "-O0", "-w"]
+hls_include_dir = ".../HLS_arbitrary_Precision_Types/include"
+preflight_repairs = 3
+preflight_run_timeout = 60
+preflight_max_chars = 4000
+
+# Staged escalation: a Vitis round only goes as far as its first failing stage (csim_design until CSim is clean, then
+# csynth_design, then cosim_design), so a testbench that still fails csim costs a csim run instead of a synthesis and
+# co-simulation. Passed stages are recorded in stage_cache_file with the hash of their inputs and are not run again
+# while those are unchanged. Rounds that stop at csim are cheap: up to csim_repair_limit of them per instance do not use
+# up one of the iteration_limit iterations.
+staged = True
+stages = ("csim", "csynth", "cosim")
+stage_commands = {
+    "csim": 'csim_design -argv "$kernel_path $output_dir"',
+    "csynth": 'csynth_design',
+    "cosim": 'cosim_design -argv "$kernel_path $output_dir"',
+}
+stage_markers = {
+    "csim": "INFO: [SIM 211-1] CSim done with 0 errors",
+    "cosim": "INFO: [COSIM 212-1000] *** C/RTL co-simulation finished: PASS ***",
+}
+stage_cache_file = os.path.join(base_dir, "hls_stages.json")
+csim_repair_limit = 3
+
+def create_vitis_tcl_script(kernel_path, testbench_path, extra_files, input_file_path, output_dir, reuse_solution=False, stage=None):
+    """Generate a TCL script running by Vitis HLS.
+    With reuse_solution, p1 only holds a cloned, already synthesized solution1: the project is built around it without
+    reset and csynth_design is skipped.
+    With stage ("csim", "csynth" or "cosim"), the script only runs that stage on p1, opened without reset so that the
+    results of the earlier stages stay in solution1."""
+    tcl_script_path = os.path.join(base_dir, f'run_vitis_{stage}.tcl' if stage else 'run_vitis.tcl')
+    reset = '' if reuse_solution or stage else '-reset '
     with open(tcl_script_path, 'w') as f:
-        f.write('open_project -reset p1\n')
+        f.write(f'open_project {reset}p1\n')
         f.write(f'add_files {kernel_path}\n')
         for file in extra_files:
             f.write(f'add_files {file}\n')
         f.write(f'add_files -tb {testbench_path}\n')
-        f.write('open_solution -reset solution1 -flow_target vitis\n')
+        f.write(f'open_solution {reset}solution1 -flow_target vitis\n')
         f.write('set_top addAndDivideAndMultiply\n')
         f.write('set_part {xcvu9p-flga2104-2-i}\n')
         f.write('create_clock -period 10\n')
-        # The hls_exec parameter is set to 2: execute csynth_design and cosim_design
-        f.write('set hls_exec 2\n')
         f.write(f'set kernel_path "{os.path.join(base_dir, "1.dat")}"\n')
         f.write(f'set output_dir "{os.path.join(base_dir, "p")}"\n')
+        if stage:
+            f.write(f'{stage_commands[stage]}\n')
+            f.write('quit\n')
+            return tcl_script_path
+        # The hls_exec parameter is set to 2: execute csynth_design and cosim_design
+        f.write('set hls_exec 2\n')
         f.write(f'csim_design -argv "$kernel_path $output_dir"\n')
         f.write('if {$hls_exec == 1} {\n')
         f.write('    csynth_design\n')
         f.write('} elseif {$hls_exec == 2} {\n')
-        f.write('    csynth_design\n')
+        if not reuse_solution:
+            f.write('    csynth_design\n')
         f.write('    cosim_design -argv "$kernel_path $output_dir"\n')
         f.write('} elseif {$hls_exec == 3} {\n')
         f.write('    csynth_design\n')
@@ -44,25 +94,281 @@ def create_vitis_tcl_script(kernel_path, testbench_path, extra_files, input_file
     return tcl_script_path
 
 def run_tcl_script(tcl_script_path, vitis_bin):
-    """Run the TCL script of Vitis HLS and count it, returning the run time and output text"""
-    command = f'{vitis_bin}/vitis-run --mode hls --tcl {tcl_script_path}'
-    start_time = time.time()
-    result = subprocess.run(command, shell=True, capture_output=True, text=True)
-    end_time = time.time()
-    elapsed_time = end_time - start_time
-    return elapsed_time, result.stdout
+    """Run the TCL script of Vitis HLS in a persistent HLS session and count it, returning the run time and output text"""
+    result = hls_worker.run_script(tcl_script_path, vitis_bin, cwd=base_dir)
+    return result["elapsed_s"], result["output"]
+
+def solution_key(kernel_path, vitis_bin):
+    """Hash of what the synthesized solution depends on: the kernel, the headers next to it, the setup and the tool"""
+    kernel_dir = os.path.dirname(os.path.abspath(kernel_path))
+    headers = [os.path.join(kernel_dir, fname) for fname in sorted(os.listdir(kernel_dir)) if fname.endswith(('.h', '.hpp'))]
+    digest = hashlib.sha256()
+    digest.update(f'{vitis_bin}\naddAndDivideAndMultiply\nxcvu9p-flga2104-2-i\n10\n'.encode())
+    for path in [kernel_path] + headers:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def reflink_or_copy(src_file, dest_file):
+    """Copy-on-write clone of a file where the file system supports it, a plain copy otherwise; keeps the timestamps"""
+    with open(src_file, 'rb') as src, open(dest_file, 'wb') as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            cloned = True
+        except OSError:
+            cloned = False
+    if not cloned:
+        shutil.copyfile(src_file, dest_file)
+    shutil.copystat(src_file, dest_file)
+    return dest_file
+
+def clone_solution(cached_solution, project_dir):
+    """Replace project_dir by a project holding only a clone of the cached solution1"""
+    if os.path.exists(project_dir):
+        shutil.rmtree(project_dir)
+    os.makedirs(project_dir)
+    shutil.copytree(cached_solution, os.path.join(project_dir, 'solution1'), copy_function=reflink_or_copy)
+
+def publish_solution(project_dir, cached_solution):
+    """Share solution1 of project_dir once csynth_design has produced it; simulation outputs are left out"""
+    solution = os.path.join(project_dir, 'solution1')
+    if os.path.exists(cached_solution) or not os.path.isdir(os.path.join(solution, 'syn', 'verilog')):
+        return
+    tmp_dir = f"{cached_solution}.{os.getpid()}.tmp"
+    shutil.copytree(solution, tmp_dir, copy_function=reflink_or_copy, ignore=shutil.ignore_patterns('csim', 'sim'))
+    try:
+        os.rename(tmp_dir, cached_solution)
+        print(f"Published the synthesized solution to {cached_solution}")
+    except OSError:
+        #  Another instance published the same kernel first
+        shutil.rmtree(tmp_dir)
 
 def run_hls(kernel_path, testbench_path, base_dir, vitis_bin):
     """Call the Vitis HLS process, generate the TCL script and run it, returning the execution time and output"""
+    if staged:
+        return run_hls_staged(kernel_path, testbench_path, base_dir, vitis_bin)
     input_file_path = os.path.join(base_dir, "1.dat")
     output_dir = os.path.join(base_dir, "p")
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-    tcl_script_path = create_vitis_tcl_script(kernel_path, testbench_path, [], input_file_path, output_dir)
+    project_dir = os.path.join(base_dir, "p1")
+    #  The full run resets p1, so no stage result of an earlier staged run holds any more
+    if os.path.exists(stage_cache_file):
+        os.remove(stage_cache_file)
+    cached_solution = None
+    reuse_solution = False
+    if synth_cache_dir:
+        os.makedirs(synth_cache_dir, exist_ok=True)
+        cached_solution = os.path.join(synth_cache_dir, solution_key(kernel_path, vitis_bin))
+        reuse_solution = os.path.isdir(cached_solution)
+    if reuse_solution:
+        print(f"Reusing the synthesized solution {cached_solution}")
+        clone_solution(cached_solution, project_dir)
+    tcl_script_path = create_vitis_tcl_script(kernel_path, testbench_path, [], input_file_path, output_dir, reuse_solution)
     elapsed_time, output_text = run_tcl_script(tcl_script_path, vitis_bin)
+    if cached_solution and not reuse_solution:
+        publish_solution(project_dir, cached_solution)
     return elapsed_time, output_text
 
-# --------------------------------------------------------------------------------------------------------------------------------
+def stage_keys(kernel_path, testbench_path, vitis_bin):
+    """Hashes of the stage inputs: csynth depends on the kernel only, csim and cosim also on the testbench and 1.dat"""
+    synth_key = solution_key(kernel_path, vitis_bin)
+    digest = hashlib.sha256(synth_key.encode())
+    for path in (testbench_path, os.path.join(base_dir, "1.dat")):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return {"csim": digest.hexdigest(), "csynth": synth_key, "cosim": digest.hexdigest()}
+
+def load_stage_cache():
+    try:
+        with open(stage_cache_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_stage_cache(passed):
+    tmp_file = f"{stage_cache_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(passed, f)
+    os.replace(tmp_file, stage_cache_file)
+
+def stage_passed(stage, result):
+    """A stage passed when its script ran through and, for csim and cosim, the tool reported a clean simulation"""
+    return result["status"] == "ok" and stage_markers.get(stage, "") in result["output"]
+
+def run_hls_staged(kernel_path, testbench_path, base_dir, vitis_bin):
+    """
+    Run the stages in order up to the first one that fails, skipping those that already passed on the same inputs.
+    :return: The run time and the output of every stage reached (recorded output for skipped stages), so the status
+             markers read by main_instance are the same as in a full run
+    """
+    input_file_path = os.path.join(base_dir, "1.dat")
+    output_dir = os.path.join(base_dir, "p")
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    project_dir = os.path.join(base_dir, "p1")
+    keys = stage_keys(kernel_path, testbench_path, vitis_bin)
+    passed = load_stage_cache()
+    elapsed_time = 0.0
+    outputs = []
+    for stage in stages:
+        if passed.get(stage, {}).get("key") == keys[stage]:
+            print(f"Stage {stage} already passed on these inputs, skipping it")
+            outputs.append(passed[stage]["output"])
+            continue
+        cached_solution = None
+        if stage == "csynth" and synth_cache_dir:
+            os.makedirs(synth_cache_dir, exist_ok=True)
+            cached_solution = os.path.join(synth_cache_dir, keys[stage])
+            if os.path.isdir(cached_solution):
+                print(f"Reusing the synthesized solution {cached_solution}")
+                clone_solution(cached_solution, project_dir)
+                passed[stage] = {"key": keys[stage], "output": f"INFO: Reused the synthesized solution {cached_solution}\n"}
+                save_stage_cache(passed)
+                outputs.append(passed[stage]["output"])
+                continue
+        #  The project file still lists the testbench of an earlier round; open_project rebuilds it around solution1
+        project_file = os.path.join(project_dir, 'hls.app')
+        if os.path.exists(project_file):
+            os.remove(project_file)
+        tcl_script_path = create_vitis_tcl_script(kernel_path, testbench_path, [], input_file_path, output_dir, stage=stage)
+        result = hls_worker.run_script(tcl_script_path, vitis_bin, cwd=base_dir)
+        elapsed_time += result["elapsed_s"]
+        outputs.append(result["output"])
+        if not stage_passed(stage, result):
+            print(f"Stage {stage} failed, not escalating further")
+            break
+        passed[stage] = {"key": keys[stage], "output": result["output"]}
+        save_stage_cache(passed)
+        if cached_solution:
+            publish_solution(project_dir, cached_solution)
+    return elapsed_time, "\n".join(outputs)
+
+def preflight_include_dirs(vitis_bin):
+    """HLS headers for the native build: those of the Vitis installation (hls_stream.h, hls_math.h, ...) and the open-source ap_int/ap_fixed ones"""
+    include_dirs = [os.path.join(os.path.dirname(os.path.abspath(vitis_bin)), "include"), hls_include_dir]
+    return [include_dir for include_dir in include_dirs if os.path.isdir(include_dir)]
+
+def clip_diagnostics(text):
+    if len(text) <= preflight_max_chars:
+        return text
+    return text[:preflight_max_chars] + "\n... (diagnostics truncated)"
+
+def run_preflight(kernel_path, testbench_path, vitis_bin):
+    """
+    Check a testbench natively, the way csim would run it: syntax check, native build and run against 1.dat.
+    :return: (passed, diagnostics), passed is None with the reason as diagnostics when the pre-flight cannot judge
+             the testbench here (no compiler or HLS headers, or a kernel that does not compile natively)
+    """
+    include_dirs = preflight_include_dirs(vitis_bin)
+    if not include_dirs or not shutil.which(preflight_compiler):
+        return None, "no native compiler or HLS headers found"
+    include_flags = [f"-I{include_dir}" for include_dir in include_dirs] + [f"-I{base_dir}"]
+    sources = [kernel_path, testbench_path]
+
+    #  The kernel alone first: if it needs Vitis-only headers or intrinsics, every testbench would fail natively and
+    #  the repairs would edit testbenches that may be fine
+    result = subprocess.run(
+        [preflight_compiler, "-fsyntax-only"] + preflight_flags + include_flags + [kernel_path],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return None, clip_diagnostics(f"the kernel does not compile natively:\n{result.stderr}")
+
+    result = subprocess.run(
+        [preflight_compiler, "-fsyntax-only"] + preflight_flags + include_flags + sources,
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return False, clip_diagnostics(f"Syntax check failed:\n{result.stderr}")
+
+    build_dir = os.path.join(base_dir, "build")
+    os.makedirs(build_dir, exist_ok=True)
+    binary = os.path.join(build_dir, "preflight.out")
+    result = subprocess.run(
+        [preflight_compiler] + preflight_flags + include_flags + sources + ["-o", binary],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return False, clip_diagnostics(f"Native build failed:\n{result.stderr}")
+
+    #  Same arguments as csim_design -argv in the TCL script, with the spectra going to a directory of their own
+    native_output_dir = os.path.join(base_dir, "p_native")
+    os.makedirs(native_output_dir, exist_ok=True)
+    try:
+        result = subprocess.run(
+            [binary, os.path.join(base_dir, "1.dat"), native_output_dir],
+            capture_output=True, text=True, timeout=preflight_run_timeout
+        )
+    except subprocess.TimeoutExpired:
+        return False, f"Native run against 1.dat did not finish within {preflight_run_timeout} seconds."
+    if result.returncode != 0:
+        return False, clip_diagnostics(
+            f"Native run against 1.dat failed with exit code {result.returncode}:\n{result.stdout[-2000:]}{result.stderr}"
+        )
+    return True, ""
+
+def repair_testbench(errors, testbench, prompt_file, gpt_output_file, new_testbench, enabled, emb_script_path, library_dir, error_injection):
+    """Ask GPT to fix testbench for errors, with the template and reference code of the enabled scheme, and write the result to new_testbench"""
+    with open(testbench, 'r') as f:
+        prev_testbench_code = f.read()
+    template_content = ""
+    ref_code = ""
+    if enabled in ["2", "3"]:
+        # Pass the current testbench file when calling get_template
+        template_file_name, template_content, highest_similarity = get_template(emb_script_path, library_dir, errors, testbench)
+        if template_content:
+            print(f"Template Name: {template_file_name}, Similarity: {highest_similarity}")
+    if enabled == "3":
+        ref_testbench_path = os.path.join(base_dir, "c_testbench.cpp")
+        if os.path.exists(ref_testbench_path):
+            with open(ref_testbench_path, 'r') as file:
+                ref_code = file.read()
+        else:
+            print(f"The referenced C++ testbench file not found: {ref_testbench_path}")
+
+    fixed_code = consult_gpt(errors, prompt_file, template_content, ref_code, prev_testbench_code, error_injection)
+    # Save the GPT output and extract the code from it
+    with open(gpt_output_file, 'w') as f:
+        f.write(fixed_code)
+    new_code = extract_code_from_gpt_output(gpt_output_file)
+    with open(new_testbench, 'w') as f:
+        f.write(new_code)
+    print(f"A new testbench file was generated: {os.path.basename(new_testbench)}")
+    return new_testbench
+
+def preflight_testbench(kernel_file, testbench, vitis_bin, repair_args):
+    """
+    Run the pre-flight on testbench and repair it from the native diagnostics until it passes or preflight_repairs
+    repairs are used up. Vitis stays the final judge: a testbench still failing the pre-flight is simulated anyway.
+    :param repair_args: (enabled, emb_script_path, library_dir, error_injection) for repair_testbench
+    :return: The testbench to hand to Vitis
+    """
+    if not preflight:
+        return testbench
+    stem = os.path.splitext(os.path.basename(testbench))[0]
+    for attempt in range(preflight_repairs + 1):
+        passed, diagnostics = run_preflight(kernel_file, testbench, vitis_bin)
+        if passed is None:
+            print(f"Pre-flight skipped: {diagnostics}")
+            return testbench
+        if passed:
+            print(f"Pre-flight passed for {os.path.basename(testbench)}.")
+            return testbench
+        print(f"Pre-flight failed for {os.path.basename(testbench)}:\n{diagnostics}")
+        if attempt == preflight_repairs:
+            print("Pre-flight repairs used up, handing the testbench to Vitis.")
+            return testbench
+        name = f"{stem}_pf{attempt + 1}"
+        testbench = repair_testbench(
+            diagnostics, testbench,
+            os.path.join(base_dir, f"prompt_{name}.txt"),
+            os.path.join(base_dir, f"GPT_{name}.txt"),
+            os.path.join(base_dir, f"{name}.cpp"),
+            *repair_args
+        )
+    return testbench
 
 def main_instance(base_dir, enabled):
     emb_script_path = os.path.join(base_dir, "emb.py")
@@ -81,7 +387,8 @@ def main_instance(base_dir, enabled):
     ref_code = ""
     # The first round prompt uses prompt0.txt; no error message is transmitted, the last round testbench code
     prompt0 = os.path.join(base_dir, "prompt0.txt")
-    generated_code = consult_gpt("", prompt0, template_content, ref_code, prev_testbench_code="")
+    # The first prompt only depends on kernel.cpp, so its response is served from the LLM cache when available
+    generated_code = consult_gpt("", prompt0, template_content, ref_code, prev_testbench_code="", cache=True)
     # Save GPT's answer to GPT0.txt
     gpt0_file = os.path.join(base_dir, "GPT0.txt")
     with open(gpt0_file, 'w') as f:
@@ -109,7 +416,9 @@ def main_instance(base_dir, enabled):
     vitis_bin = '.../bin'
     compile_output = ""
     
-    # First round HLS comprehensive
+    repair_args = (enabled, emb_script_path, library_dir, error_injection)
+    # Native pre-flight and repairs, then the first round HLS comprehensive
+    current_testbench = preflight_testbench(kernel_file, current_testbench, vitis_bin, repair_args)
     elapsed_time, compile_output = run_hls(kernel_file, current_testbench, base_dir, vitis_bin)
     print(f"The first round of HLS comprehensive time {elapsed_time:.2f} seconds")
     print("First round HLS output:")
@@ -129,44 +438,30 @@ def main_instance(base_dir, enabled):
             re_file.write("Compilation successfully, Simulation successfully.\n")
         return
 
-    # Starting from the second round
-    for iteration in range(1, iteration_limit):
-        print(f"\nIteration {iteration + 1}: Generate a new testbench and perform HLS synthesis...")
-        prompt_file = os.path.join(base_dir, f"prompt{iteration + 1}.txt")
-        with open(current_testbench, 'r') as f:
-            prev_testbench_code = f.read()
+    # Starting from the second round. In staged mode a round that stopped at csim is a csim repair, counted against
+    # csim_repair_limit instead of iteration_limit; attempt numbers the rounds and their files
+    iteration = 1
+    attempt = 1
+    csim_repairs = 0
+    while iteration < iteration_limit:
+        print(f"\nIteration {attempt + 1}: Generate a new testbench and perform HLS synthesis...")
+        prompt_file = os.path.join(base_dir, f"prompt{attempt + 1}.txt")
         errors = previous_errors  
-        template_content = ""
-        ref_code = ""
-        if enabled in ["2", "3"]:
-            # Pass the current testbench file when calling get_template
-            template_file_name, template_content, highest_similarity = get_template(emb_script_path, library_dir, errors, current_testbench)
-            if template_content:
-                print(f"Template Name: {template_file_name}, Similarity: {highest_similarity}")
-        if enabled == "3":
-            ref_testbench_path = os.path.join(base_dir, "c_testbench.cpp")
-            if os.path.exists(ref_testbench_path):
-                with open(ref_testbench_path, 'r') as file:
-                    ref_code = file.read()
-            else:
-                print(f"The referenced C++ testbench file not found: {ref_testbench_path}")
-        
-        fixed_code = consult_gpt(errors, prompt_file, template_content, ref_code, prev_testbench_code, error_injection)
-        # Save the GPT output to GPT{i}.txt and extract the code from it
-        gpt_output_file = os.path.join(base_dir, f"GPT{iteration + 1}.txt")
-        with open(gpt_output_file, 'w') as f:
-            f.write(fixed_code)
-        new_code = extract_code_from_gpt_output(gpt_output_file)
-        # The newly generated testbench is named kernel_testbench0_c{iteration}.cpp
-        current_testbench = os.path.join(base_dir, f"kernel_testbench0_c{iteration}.cpp")
-        with open(current_testbench, 'w') as f:
-            f.write(new_code)
-        print(f"A new testbench file was generated: {os.path.basename(current_testbench)}")
+        # Save the GPT output to GPT{i}.txt; the newly generated testbench is named kernel_testbench0_c{attempt}.cpp
+        gpt_output_file = os.path.join(base_dir, f"GPT{attempt + 1}.txt")
+        new_testbench = os.path.join(base_dir, f"kernel_testbench0_c{attempt}.cpp")
+        current_testbench = repair_testbench(errors, current_testbench, prompt_file, gpt_output_file, new_testbench, *repair_args)
+        current_testbench = preflight_testbench(kernel_file, current_testbench, vitis_bin, repair_args)
         
         elapsed_time, compile_output = run_hls(kernel_file, current_testbench, base_dir, vitis_bin)
         print(f"HLS comprehensive time {elapsed_time:.2f} seconds")
         print("HLS output:")
         print(compile_output)
+        attempt += 1
+        if staged and stage_markers["csim"] not in compile_output and csim_repairs < csim_repair_limit:
+            csim_repairs += 1
+        else:
+            iteration += 1
         
         # Check whether the success flag is included
         if "INFO: [COSIM 212-1000] *** C/RTL co-simulation finished: PASS ***" in compile_output:
@@ -179,7 +474,7 @@ def main_instance(base_dir, enabled):
         
         errors = extract_error_info(compile_output)
         if not errors:
-            print(f"Success: HLS synthesis has no errors after {iteration + 1} iterations.")
+            print(f"Success: HLS synthesis has no errors after {attempt} iterations.")
             correct_file_name = os.path.basename(kernel_file).replace('.cpp', '_correct.cpp')
             correct_file_path = os.path.join(base_dir, correct_file_name)
             shutil.copy(kernel_file, correct_file_path)
@@ -208,7 +503,7 @@ def extract_error_info(compile_output):
         return compile_output[start_idx:end_idx]
     return compile_output
 
-def consult_gpt(errors, prompt_file, template_content="", ref_code="", prev_testbench_code="", error_injection=""):
+def consult_gpt(errors, prompt_file, template_content="", ref_code="", prev_testbench_code="", error_injection="", cache=False):
     """
     Call GPT to generate or correct HLS testbench code.
     Parameters:
@@ -218,6 +513,7 @@ def consult_gpt(errors, prompt_file, template_content="", ref_code="", prev_test
     ref_code: Reference C++ testbench code (optional).
     prev_testbench_code: Complete code of the testbench generated in the previous round.
     error_injection: If it is not empty, it means that the current instance is an error injection instance, and this error information is attached to the GPT prompt.
+    cache: Serve the response from the shared LLM cache when the same prompt was answered before.
     The kernel code is automatically read from kernel.cpp internally and added to the prompt.
     """
     kernel_path = os.path.join(base_dir, "kernel.cpp")
@@ -259,15 +555,14 @@ def consult_gpt(errors, prompt_file, template_content="", ref_code="", prev_test
     with open(prompt_file, 'w') as f:
         f.write(message_content)
     
-    client = openai.OpenAI()
-    response = client.chat.completions.create(
+    return llm.chat(
         model="gpt-4o-mini",
+        cache=cache,
         messages=[
             {"role": "system", "content": "You are a helper program for generating and repairing HLS testbench code."},
             {"role": "user", "content": message_content_for_gpt}
         ]
     )
-    return response.choices[0].message.content
 
 def get_template(emb_script_path, library_dir, error_message, testbench_file):
     """
@@ -0,0 +1,37 @@
+import raf
+
+
+def write_dat(path, lines):
+    path.write_text("".join(f"{line}\n" for line in lines))
+
+
+def test_single_line_vectors_drop_repeats(tmp_path):
+    dat_file, output_file = tmp_path / "1.dat", tmp_path / "1_raf.dat"
+    write_dat(dat_file, ["1 2", "3 4", "01 2"])
+    keys, kept, dropped = raf.filter_dat_file(str(dat_file), str(output_file), set())
+    assert kept == [0, 1]
+    assert dropped == 1
+    assert output_file.read_text() == "1 2\n3 4\n"
+
+
+def test_two_line_vectors_are_kept_or_dropped_whole(tmp_path):
+    #  ga reads a test case as two lines: an identical second line is not a repeat, and a dropped vector takes both
+    #  of its lines with it so the following pairs stay aligned
+    dat_file, output_file = tmp_path / "1.dat", tmp_path / "1_raf.dat"
+    write_dat(dat_file, ["1 2", "9", "3 4", "9", "1 2", "9", "5 6", "7"])
+    keys, kept, dropped = raf.filter_dat_file(str(dat_file), str(output_file), set(), lines_per_vector=2)
+    assert kept == [0, 2, 6]
+    assert dropped == 1
+    assert output_file.read_text() == "1 2\n9\n3 4\n9\n5 6\n7\n"
+
+
+def test_two_line_vectors_against_the_index(tmp_path):
+    dat_file, output_file = tmp_path / "2.dat", tmp_path / "2_raf.dat"
+    write_dat(dat_file, ["1 2", "9", "3 4", "9"])
+    index = set()
+    keys, _, _ = raf.filter_dat_file(str(dat_file), str(output_file), index, lines_per_vector=2)
+    raf.commit_keys(str(tmp_path / "raf_index.txt"), index, keys[:1])
+    keys, kept, dropped = raf.filter_dat_file(str(dat_file), str(output_file), index, lines_per_vector=2)
+    assert kept == [2]
+    assert dropped == 1
+    assert output_file.read_text() == "3 4\n9\n"
@@ -1,8 +1,23 @@
 import os
+import shutil
 import subprocess
-import openai
 import random
 import re
+import json
+import hashlib
+import sys
+import threading
+import queue
+import fcntl
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import spectra
+import spectra_store
+import rules
+import raf
+import spans
+import llm
+import hls_worker
 
 
 # Define directory
@@ -14,45 +29,133 @@ spectre_dir = os.path.join(hlso_base_dir, "spectre")
 gt_dir = os.path.join(hlso_base_dir, "gt")  
 vitis_bin = ".../bin"
 report_file = os.path.join(hlso_base_dir, "report.txt")
+report_simple_file = os.path.join(hlso_base_dir, "report_simple.txt")
+report_index_file = os.path.join(hlso_base_dir, "report_index.json")
+mutation_weights_file = os.path.join(hlso_base_dir, "check", "mutation_weights.json")
+
+# Campaign checkpoint, written atomically every checkpoint_interval completed rounds and read by --resume
+checkpoint_file = os.path.join(hlso_base_dir, "checkpoint.json")
+checkpoint_interval = 1
+
+# Batched GPT test vectors: a background thread asks for gpt_batch_size vectors per request and keeps up to
+# gpt_prefetch_limit validated vectors queued, so a round takes its GPT vectors without waiting on the API.
+# A failure the LLM client does not retry, or gpt_prefetch_max_failures batches in a row that fail or bring no valid
+# vector, stop the producer and are raised in the round waiting for vectors. Every batch takes the .dat file of the
+# current round (gpt_example_file, updated by main) as its example. main creates the queue and the stop event of
+# each campaign.
+gpt_prefetch = True
+gpt_batch_size = 50
+gpt_prefetch_limit = 200
+gpt_prefetch_max_failures = 3
+gpt_prefetch_poll = 1.0
+gpt_vector_queue = None
+gpt_prefetch_stop = threading.Event()
+gpt_example_file = None
+
+# Per-stage timing spans: one JSONL record per stage run, and a per-stage summary written when the campaign ends
+spans_file = os.path.join(hlso_base_dir, "timing", "spans.jsonl")
+spans_summary_file = os.path.join(hlso_base_dir, "timing", "summary.json")
+spans.configure(spans_file)
+
+# C++ reference build cache: one binary per hash of sources, flags and compiler version
+cpp_build_dir = os.path.join(co_base_dir, "build")
+cpp_compiler = "g++"
+cpp_optimize = False
+cpp_build_lock = threading.Lock()
+compiler_versions = {}
+
+# Synthesize once per kernel/pragma hash and only run csim/cosim on the kept solution in later rounds
+reuse_synthesis = True
+hls_project_dir = os.path.join(hlso_base_dir, "hls_project")
+hls_exec = 1
+synthesis_lock = threading.Lock()
+FICLONE = 0x40049409
+
+# Sharded simulation: a round's vectors are split into contiguous shards, each simulated in its own project directory
+# (hls_project_shard<k>, a clone of the synthesized default project) by its own vitis-run process or HLS session of
+# hls_worker.py, and the shard spectra are concatenated back in vector order. csim/cosim runs single-threaded, so
+# shards scale with the number of runs side by side (HLSOLLM_HLS_WORKERS).
+simulation_shards = hls_worker.slots
+min_shard_vectors = 8
+lines_per_vector = 1  # .dat lines the testbench reads per test case (ga reads two); shard boundaries are aligned to it
+
+# Tiered simulation: screen every vector with a native g++ build of the HLS kernel against the
+# open-source ap_int/ap_fixed headers and only send the interesting ones to Vitis
+tiered_simulation = True
+hls_include_dir = ".../HLS_arbitrary_Precision_Types/include"
+native_build_dir = os.path.join(hlso_base_dir, "build")
+
+# Per HLS spectra file: (min, max) of all native values seen so far in the campaign
+native_extremes = {}
+
+# Redundancy-aware filtering: vectors already simulated (by normalized fingerprint) are not simulated again,
+# including across restarts through the on-disk index
+redundancy_filtering = True
+raf_index_file = os.path.join(hlso_base_dir, "raf_index.txt")
+raf_index = raf.load_index(raf_index_file) if redundancy_filtering else set()
+
+# Predictive skip: after the cheap CPU reference run, also drop vectors whose quantized CPU spectra signature
+# was already simulated, unless they hit a new extreme or a type limit of some variable
+predictive_skip = True
+signature_quantum = 1.0
+signature_variables = None  # Variables of the rule table that form the signature; None uses all of them
+signature_limits = (-2**31, 2**31 - 1, -2**15, 2**15 - 1, 2**16 - 1, 0)
+cpu_extremes = {}
+cpu_extremes_by_round = {}  # Copy of cpu_extremes right after each round's CPU reference run, for the checkpoint
+cpu_extremes_lock = threading.Lock()
 
 # Create the required directory
 os.makedirs(diff_dir, exist_ok=True)
 os.makedirs(spectre_dir, exist_ok=True)
 os.makedirs(gt_dir, exist_ok=True)
 
+# Discrepancy rules of the kernel under test, compiled once into a per-variable dispatch table
+rule_spec_file = os.path.join(hlso_base_dir, "rules.json")
+rule_table = rules.compile_rules(rules.load_rule_spec(rule_spec_file))
+
+# Spectra files written by the HLS testbench
+spectre_files = [entry["hls_file"] for entry in rule_table]
+
 # Global line number offset
-global_line_number = {
-    "input_a.txt": 1,
-    "input_b.txt": 1,
-    "add_result.txt": 1,
-    "subtract_result.txt": 1,
-    "divide.txt": 1,
-    "multiply.txt": 1,
-    "bitwise_and.txt": 1,
-    "bitwise_or.txt": 1,
-    "bitwise_xor.txt": 1,
-    "mod_result.txt": 1
-}
+global_line_number = {fname: 1 for fname in spectre_files}
 
 # Types of detection errors
-error_types = {
-    "input_a truncation": False,
-    "input_b truncation": False,
-    "add_result overflow": False,
-    "divide by zero error": False,
-    "divide error": False,
-    "multiply_result overflow": False,
-    "bitwise_and error": False,
-    "bitwise_or error": False,
-    "bitwise_xor error": False,
-    "mod_result error":  False
-}
+error_types = {error_type: False for error_type in rules.error_type_names(rule_table)}
 
 # Global variables: Store detected errors to avoid repeated writes
 global_detected_errors = set()
 all_error_types = set(error_types.keys())
 
-def generate_gpt_test_vector(kernel_file, current_dat_file, test_id):
+def generate_gpt_test_vector(kernel_file, current_dat_file, test_id, count=None):
+    """
+    Write the GPT vectors of a round to gt{test_id}.dat. With gpt_prefetch they are taken from the prefetch queue,
+    which only blocks while the first batch is being generated or when the API falls behind.
+    :param count: Number of vectors the round needs; required with gpt_prefetch, otherwise the whole response is used
+    """
+    output_file = os.path.join(gt_dir, f"gt{test_id}.dat")
+
+    if gpt_prefetch:
+        vectors = []
+        waiting = False
+        while len(vectors) < count:
+            try:
+                vector = gpt_vector_queue.get(timeout=gpt_prefetch_poll)
+            except queue.Empty:
+                if gpt_prefetch_stop.is_set():
+                    raise RuntimeError(f"GPT prefetch stopped before iteration {test_id} got its vectors")
+                if not waiting:
+                    print(f"Waiting for prefetched GPT vectors for iteration {test_id} ({len(vectors)} of {count})...")
+                    waiting = True
+                continue
+            if isinstance(vector, Exception):
+                #  Left in the queue so that later rounds fail the same way instead of waiting
+                gpt_vector_queue.put(vector)
+                raise RuntimeError(f"GPT prefetch failed: {vector}") from vector
+            vectors.append(vector)
+        with open(output_file, 'w') as output_f:
+            output_f.writelines(f"{vector}\n" for vector in vectors)
+        print(f"GPT-generated test vector saved to {output_file}")
+        return
 
     with open(kernel_file, 'r') as kernel_f:
         kernel_content = kernel_f.read()
@@ -62,10 +165,10 @@ def generate_gpt_test_vector(kernel_file, current_dat_file, test_id):
 
     prompt_file = os.path.join(gt_dir, f"prompt_{test_id}.txt")
     action_file = os.path.join(gt_dir, f"action_{test_id}.txt")
-    output_file = os.path.join(gt_dir, f"gt{test_id}.dat")
 
     # Call GPT to generate
-    gpt_output = consult_gpt(kernel_content, dat_content, prompt_file)
+    with spans.round_scope(test_id):
+        gpt_output = consult_gpt(kernel_content, dat_content, prompt_file)
     with open(action_file, 'w') as action_f:
         action_f.write(gpt_output)
 
@@ -76,7 +179,96 @@ def generate_gpt_test_vector(kernel_file, current_dat_file, test_id):
 
     print(f"GPT-generated test vector saved to {output_file}")
 
-def consult_gpt(kernel_code, dat_content, prompt_file):
+
+def validate_gpt_vectors(lines, dat_content):
+    """
+    Keep the generated lines that look like vectors of the example: numeric tokens only (integers normalized, other
+    numbers kept as written), with a token count within the range of the example's lines.
+    """
+    lengths = [len(line.split()) for line in dat_content.splitlines() if line.strip()]
+    if not lengths:
+        return []
+    valid = []
+    for line in lines:
+        tokens = line.split()
+        if not min(lengths) <= len(tokens) <= max(lengths):
+            continue
+        try:
+            valid.append(" ".join(normalize_token(token) for token in tokens))
+        except ValueError:
+            continue
+    return valid
+
+
+def normalize_token(token):
+    try:
+        return str(int(token))
+    except ValueError:
+        float(token)
+        return token
+
+
+def prefetch_gpt_vectors(kernel_file, vector_queue, stop):
+    """
+    Background producer of the GPT vector queue: requests batches of gpt_batch_size vectors with the kernel and
+    the vectors of gpt_example_file as example, validates them and blocks while the queue is full, until stop is set.
+    When it gives up, the error is queued for the consumer and stop is set.
+    :param vector_queue: Queue of the campaign, gpt_vector_queue when main started it
+    :param stop: Stop event of the campaign, gpt_prefetch_stop when main started it
+    """
+    try:
+        with open(kernel_file, 'r') as kernel_f:
+            kernel_content = kernel_f.read()
+
+        batch = 0
+        failures = 0
+        while not stop.is_set():
+            batch += 1
+            #  Read per batch, so the requests follow the mutated and combined vectors of the latest round
+            with open(gpt_example_file, 'r') as dat_f:
+                dat_content = dat_f.read()
+            prompt_file = os.path.join(gt_dir, f"prompt_batch_{batch}.txt")
+            action_file = os.path.join(gt_dir, f"action_batch_{batch}.txt")
+            try:
+                gpt_output = consult_gpt(kernel_content, dat_content, prompt_file, count=gpt_batch_size, batch=batch)
+                with open(action_file, 'w') as action_f:
+                    action_f.write(gpt_output)
+                vectors = validate_gpt_vectors(extract_vector_from_gpt_output(action_file).splitlines(), dat_content)
+                error = None if vectors else ValueError(f"no valid vector in the response (see {action_file})")
+                fatal = False
+            except Exception as e:
+                #  The LLM client has already retried transient errors; the others (e.g. authentication) will not go away
+                error = e
+                fatal = not llm.retryable(e)
+            if error is not None:
+                failures += 1
+                print(f"GPT batch {batch} failed: {error}")
+                if fatal or failures >= gpt_prefetch_max_failures:
+                    print(f"Stopping the GPT prefetch after {failures} failed batch(es).")
+                    raise error
+                stop.wait(5)
+                continue
+            failures = 0
+            print(f"GPT batch {batch}: {len(vectors)} valid vectors queued.")
+
+            for vector in vectors:
+                while not stop.is_set():
+                    try:
+                        vector_queue.put(vector, timeout=1)
+                        break
+                    except queue.Full:
+                        continue
+    except Exception as e:
+        #  Also for unexpected errors: a producer that died silently would leave the consumer waiting for good
+        stop.set()
+        vector_queue.put(e)
+
+
+def consult_gpt(kernel_code, dat_content, prompt_file, count=None, batch=None):
+    """
+    :param count: Number of vectors to ask for; None asks for one test vector file like the example
+    :param batch: Batch number of a prefetch request, so that successive batches are distinct requests
+    """
     message_content = (
         "You are a professional assistant for generating realistic test vectors for High-Level Synthesis (HLS).\n"
         "The kernel implementation and an example test vector are provided. Generate a new test vector in the same format as the example test vector but with randomized, realistic values.\n"
@@ -91,21 +283,24 @@ def consult_gpt(kernel_code, dat_content, prompt_file):
         "```\n\n"
         "Generate a new test vector in the same format, ensuring randomness. All generated test vector should be placed between ``` and ``` without other words."
     )
+    if count is not None:
+        message_content += f"\nGenerate {count} new test vectors, one per line, in the same format as the lines of the example (batch {batch})."
 
     # Save prompt to file
     with open(prompt_file, 'w') as f:
         f.write(message_content)
 
     # Call GPT
-    client = openai.OpenAI()
-    response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "You are an assistant for generating realistic test vectors for HLS."},
-            {"role": "user", "content": message_content}
-        ]
-    )
-    return response.choices[0].message.content
+    with spans.span("llm_call", model="gpt-4o"):
+        #  Test vectors need a fresh sample every round, so the response cache is bypassed
+        return llm.chat(
+            model="gpt-4o",
+            cache=False,
+            messages=[
+                {"role": "system", "content": "You are an assistant for generating realistic test vectors for HLS."},
+                {"role": "user", "content": message_content}
+            ]
+        )
 
 
 def extract_vector_from_gpt_output(gpt_output_file):
@@ -188,9 +383,10 @@ def generate_combined_dat_file(gpt_file, mutation_file, output_file, gpt_ratio,
 
 
 
-def create_tcl_script(kernel_path, testbench_path, kernel_src, output_dir):
-    # The original code content remains unchanged
-    tcl_script_path = f"{hlso_base_dir}/run_vitis.tcl"
+def create_tcl_script(kernel_path, testbench_path, kernel_src, output_dir, tcl_script_path=None):
+    # Absolute paths, so the script does not depend on the directory the HLS session runs in
+    tcl_script_path = tcl_script_path or f"{hlso_base_dir}/run_vitis.tcl"
+    kernel_path, testbench_path, kernel_src, output_dir = map(os.path.abspath, (kernel_path, testbench_path, kernel_src, output_dir))
     with open(tcl_script_path, 'w') as f:
         f.write(f'''
 open_project -reset {output_dir}
@@ -228,15 +424,204 @@ quit
     return tcl_script_path
 
 
+def hls_project_setup(kernel_src, testbench_path, project_dir):
+    """Project and solution setup shared by the synthesis script; everything csynth depends on besides file contents."""
+    kernel_src, testbench_path, project_dir = map(os.path.abspath, (kernel_src, testbench_path, project_dir))
+    return f'''
+open_project -reset {project_dir}
+
+# Add kernel source file
+add_files {kernel_src}
+# Add testbench file
+add_files -tb {testbench_path}
+set_top addAndDivideAndMultiply
+
+open_solution -reset solution1 -flow_target vitis
+set_part  {{xcvu9p-flga2104-2-i}}
+create_clock -period 10
+'''
+
+
+def synthesis_key(kernel_src, testbench_path, project_dir):
+    """
+    Hash of everything the synthesized solution depends on: the kernel with its pragmas, the headers next to it,
+    the testbench registered in the project and the top/part/clock setup. Test vectors are not part of it.
+    """
+    kernel_dir = os.path.dirname(os.path.abspath(kernel_src))
+    headers = [
+        os.path.join(kernel_dir, fname) for fname in sorted(os.listdir(kernel_dir))
+        if fname.endswith((".h", ".hpp"))
+    ]
+    digest = hashlib.sha256()
+    digest.update(hls_project_setup(kernel_src, testbench_path, project_dir).encode())
+    for path in [kernel_src, testbench_path] + headers:
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def create_synthesis_tcl_script(kernel_src, testbench_path, project_dir, tcl_script_path=None):
+    tcl_script_path = tcl_script_path or f"{hlso_base_dir}/synth_vitis.tcl"
+    with open(tcl_script_path, 'w') as f:
+        f.write(hls_project_setup(kernel_src, testbench_path, project_dir))
+        f.write("csynth_design\nquit\n")
+    return tcl_script_path
+
+
+def create_simulation_tcl_script(kernel_path, output_dir, project_dir, tcl_script_path=None):
+    """Open the already synthesized solution without reset and only simulate the new test vectors."""
+    tcl_script_path = tcl_script_path or f"{hlso_base_dir}/run_vitis.tcl"
+    kernel_path, output_dir, project_dir = map(os.path.abspath, (kernel_path, output_dir, project_dir))
+    with open(tcl_script_path, 'w') as f:
+        f.write(f'''
+open_project {project_dir}
+open_solution solution1
+set hls_exec {hls_exec}
+
+# Set simulation command line parameters, pass input file path and output directory
+set kernel_path "{kernel_path}"
+set output_dir "{output_dir}"
+csim_design -argv "$kernel_path $output_dir"
+
+if {{$hls_exec == 2}} {{
+    cosim_design -argv "$kernel_path $output_dir"
+}} elseif {{$hls_exec == 3}} {{
+    cosim_design  -argv "$kernel_path $output_dir"
+    export_design
+}}
+quit
+''')
+    return tcl_script_path
+
+
+def ensure_synthesized(kernel_src, testbench_path, project_dir, tcl_script_path=None):
+    """
+    Run csynth_design only if the kept solution was built from different sources.
+    The key is recorded after a successful run, so an interrupted synthesis is redone next time.
+    :param tcl_script_path: Where to write the synthesis script, synth_vitis.tcl by default
+    :return: The key of the synthesized solution
+    """
+    key = synthesis_key(kernel_src, testbench_path, project_dir)
+    key_file = os.path.join(project_dir, "csynth.key")
+    if os.path.exists(key_file):
+        with open(key_file, 'r') as f:
+            if f.read().strip() == key:
+                print(f"Reusing synthesized solution in {project_dir}")
+                return key
+
+    print(f"Synthesizing kernel into {project_dir}...")
+    with spans.span("tcl_gen"):
+        tcl_script_path = create_synthesis_tcl_script(kernel_src, testbench_path, project_dir, tcl_script_path)
+    with spans.span("csynth"):
+        run_tcl_script(tcl_script_path)
+    os.makedirs(project_dir, exist_ok=True)
+    with open(key_file, 'w') as f:
+        f.write(key + "\n")
+    return key
+
+
+def reflink_or_copy(src_file, dest_file):
+    """Copy-on-write clone of a file where the file system supports it, a plain copy otherwise; keeps the timestamps"""
+    with open(src_file, 'rb') as src, open(dest_file, 'wb') as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            cloned = True
+        except OSError:
+            cloned = False
+    if not cloned:
+        shutil.copyfile(src_file, dest_file)
+    shutil.copystat(src_file, dest_file)
+    return dest_file
+
+
+def ensure_shard_project(shard, key):
+    """
+    Give a shard its own copy of the synthesized default project, cloned like tb_gene.py clones cached solutions,
+    unless it already holds the solution of key. Simulation outputs are left out; csim and cosim rebuild them.
+    """
+    project_dir = shard_paths(shard)[0]
+    key_file = os.path.join(project_dir, "csynth.key")
+    if os.path.exists(key_file):
+        with open(key_file, 'r') as f:
+            if f.read().strip() == key:
+                return
+    print(f"Cloning the synthesized solution of {hls_project_dir} into {project_dir}")
+    with spans.span("project_clone", shard=shard):
+        if os.path.exists(project_dir):
+            shutil.rmtree(project_dir)
+        shutil.copytree(hls_project_dir, project_dir, copy_function=reflink_or_copy, ignore=shutil.ignore_patterns('csim', 'sim'))
+
+
 def run_tcl_script(tcl_script_path):
-    # The original code content remains unchanged
-    vitis_run = os.path.join(vitis_bin, "vitis-run")
-    if not os.path.exists(vitis_run):
-        raise FileNotFoundError(f"Vitis 'vitis-run' binary not found at {vitis_run}")
-    
-    command = f"{vitis_run} --mode hls --tcl {tcl_script_path}"
-    print(f"Executing command: {command}")
-    subprocess.run(command, shell=True, check=True)
+    """
+    Run a generated TCL script in a persistent HLS session (hls_worker.py) from the current directory, like
+    `vitis-run --tcl` did, with its output streamed to stdout; raises when it fails. The CPU time and peak RSS of
+    the job go to the enclosing span as hls_cpu_s and hls_peak_rss_kb.
+    """
+    print(f"Running {tcl_script_path} in an HLS session")
+    result = hls_worker.run_script(tcl_script_path, vitis_bin, stream=sys.stdout)
+    if "cpu_s" in result:
+        spans.annotate(hls_cpu_s=round(result["cpu_s"], 6), hls_peak_rss_kb=result["peak_rss_kb"])
+    if result["status"] != "ok":
+        raise subprocess.CalledProcessError(result["returncode"], tcl_script_path, output=result["output"])
+
+
+def cpp_build_flags():
+    """Flags of the C++ reference and native builds, read from cpp_optimize at build time so it can be changed after import"""
+    return ["-O2"] if cpp_optimize else []
+
+
+def get_compiler_version(compiler):
+    """Return the `--version` banner of the compiler, queried once per process."""
+    if compiler not in compiler_versions:
+        result = subprocess.run([compiler, "--version"], capture_output=True, text=True, check=True)
+        compiler_versions[compiler] = result.stdout.strip()
+    return compiler_versions[compiler]
+
+
+def build_cached_binary(sources, build_dir, compiler, flags, name):
+    """
+    Compile sources into a binary stored under a content-addressed name and reuse it when it already exists.
+    The key covers the sources, the headers next to them, the flags and the compiler version,
+    so the binary survives across rounds and restarts and is rebuilt only when one of those changes.
+    :param sources: Source files passed to the compiler
+    :param build_dir: Directory holding the cached binaries
+    :param compiler: Compiler executable
+    :param flags: Extra compiler flags
+    :param name: Prefix of the binary file name
+    :return: Path of the binary
+    """
+    source_dirs = sorted(set(os.path.dirname(os.path.abspath(src)) for src in sources))
+    headers = []
+    for source_dir in source_dirs:
+        headers.extend(
+            os.path.join(source_dir, fname) for fname in sorted(os.listdir(source_dir))
+            if fname.endswith((".h", ".hpp"))
+        )
+
+    digest = hashlib.sha256()
+    digest.update(get_compiler_version(compiler).encode())
+    digest.update("\0".join(flags).encode())
+    for path in list(sources) + headers:
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    binary = os.path.join(build_dir, f"{name}_{digest.hexdigest()[:16]}.out")
+
+    with cpp_build_lock:
+        if os.path.exists(binary):
+            print(f"Reusing cached binary: {binary}")
+            return binary
+
+        os.makedirs(build_dir, exist_ok=True)
+        tmp_binary = f"{binary}.{os.getpid()}.tmp"
+        compile_command = " ".join([compiler] + list(flags) + list(sources) + ["-o", tmp_binary])
+        print(f"Compiling with command: {compile_command}")
+        with spans.span("cpp_compile", binary=name):
+            subprocess.run(compile_command, shell=True, check=True)
+        #  Publish atomically so an interrupted build never leaves a truncated binary behind
+        os.replace(tmp_binary, binary)
+    return binary
 
 
 def run_cpp_test(test_id, dat_file):
@@ -249,186 +634,393 @@ def run_cpp_test(test_id, dat_file):
         raise FileNotFoundError("C++ kernel or testbench source file missing.")
 
     os.makedirs(cpp_output_dir, exist_ok=True)
-    compile_command = f"g++ {cpp_kernel_path} {cpp_testbench_path} -o {cpp_output_dir}/test.out"
-    print(f"Compiling C++ test program with command: {compile_command}")
-    subprocess.run(compile_command, shell=True, check=True)
+    test_binary = build_cached_binary(
+        [cpp_kernel_path, cpp_testbench_path], cpp_build_dir, cpp_compiler, cpp_build_flags(), "test"
+    )
 
-    run_command = f"{cpp_output_dir}/test.out {dat_file} {cpp_output_dir} {test_id}"
+    run_command = f"{test_binary} {dat_file} {cpp_output_dir} {test_id}"
     print(f"Running C++ test for iteration {test_id} with command: {run_command}")
-    subprocess.run(run_command, shell=True, check=True)
+    with spans.span("cpp_run"):
+        subprocess.run(run_command, shell=True, check=True)
 
 
-def run_hls_test(test_id, dat_file):
-    # The original code content remains unchanged
-    global global_line_number
-    hls_output_dir = f"{hlso_base_dir}/p{test_id}"
+def shard_paths(shard):
+    """Project directory and simulation TCL script of a shard; shard None (unsharded) and shard 0 use the defaults"""
+    if not shard:
+        return hls_project_dir, f"{hlso_base_dir}/run_vitis.tcl"
+    return f"{hls_project_dir}_shard{shard}", f"{hlso_base_dir}/run_vitis_shard{shard}.tcl"
+
+
+def simulate_shard(dat_file, hls_output_dir, shard=None):
+    """
+    Run the Vitis flow on dat_file, with the testbench writing its spectra to hls_output_dir.
+    :param shard: Number of the shard, which selects its own project directory and TCL script so that shards can run
+                  side by side; the default project is synthesized once per kernel and cloned into the shard projects
+    """
     os.makedirs(hls_output_dir, exist_ok=True)
+    kernel_src = f"{hlso_base_dir}/kernel.cpp"
+    testbench_path = f"{hlso_base_dir}/kernel_testbench.cpp"
+    project_dir, run_script_path = shard_paths(shard)
+    attrs = {"dat_file": os.path.basename(dat_file)}
+    if shard is not None:
+        attrs["shard"] = shard
+
+    if reuse_synthesis:
+        #  Shards started side by side wait for the one synthesis of the default project
+        with synthesis_lock:
+            key = ensure_synthesized(kernel_src, testbench_path, hls_project_dir)
+            if shard:
+                ensure_shard_project(shard, key)
+        with spans.span("tcl_gen"):
+            tcl_script_path = create_simulation_tcl_script(kernel_path=dat_file, output_dir=hls_output_dir, project_dir=project_dir, tcl_script_path=run_script_path)
+        #  The simulation script runs csim, followed by cosim when hls_exec asks for it
+        stage = "csim" if hls_exec == 1 else "cosim"
+    else:
+        with spans.span("tcl_gen"):
+            tcl_script_path = create_tcl_script(kernel_path=dat_file, testbench_path=testbench_path, kernel_src=kernel_src, output_dir=hls_output_dir, tcl_script_path=run_script_path)
+        stage = "csim_csynth"
+    with spans.span(stage, **attrs):
+        run_tcl_script(tcl_script_path)
+
+
+def split_shards(dat_file, hls_output_dir, shard_count):
+    """
+    Split dat_file into shard_count contiguous shards of nearly equal numbers of vectors, in vector order.
+    :return: [(shard .dat file, shard output directory, number of vectors)] in shard order
+    """
+    with open(dat_file, 'r') as f:
+        lines = f.readlines()
+    #  A trailing incomplete vector stays with the last shard, where the testbench sees it like in an unsharded run
+    vector_count = len(lines) // lines_per_vector
+    base, _ = os.path.splitext(dat_file)
+    size, extra = divmod(vector_count, shard_count)
+    shards = []
+    start = 0
+    for shard in range(shard_count):
+        end = start + size + (1 if shard < extra else 0)
+        shard_dat_file = f"{base}_shard{shard}.dat"
+        shard_output_dir = f"{hls_output_dir}_shard{shard}"
+        last_line = len(lines) if shard == shard_count - 1 else end * lines_per_vector
+        with open(shard_dat_file, 'w') as f:
+            f.writelines(lines[start * lines_per_vector:last_line])
+        #  A shard directory left by an interrupted run must not leak rows into the merge
+        if os.path.exists(shard_output_dir):
+            shutil.rmtree(shard_output_dir)
+        shards.append((shard_dat_file, shard_output_dir, end - start))
+        start = end
+    return shards
+
+
+def merge_shards(shards, hls_output_dir):
+    """
+    Concatenate the spectra files of the shards in shard order into hls_output_dir, which restores the original vector
+    order: the rows of a merged file are those of an unsharded run, so the line numbers of the diff rows and the
+    offsets in global_line_number advance exactly as before.
+    :return: False, writing nothing, when the shards do not write the same number of rows per vector to a spectra
+             file, which is how a testbench reading more lines per test case than lines_per_vector usually shows
+    """
+    fnames = sorted(set(fname for _, shard_output_dir, _ in shards for fname in os.listdir(shard_output_dir)))
+    merged = {}
+    for fname in fnames:
+        rows = []
+        expected = None
+        for shard, (_, shard_output_dir, vector_count) in enumerate(shards):
+            shard_path = os.path.join(shard_output_dir, fname)
+            shard_rows = []
+            if os.path.exists(shard_path):
+                with open(shard_path, 'r') as f:
+                    shard_rows = f.readlines()
+            if fname in spectre_files:
+                if expected is None:
+                    expected = (len(shard_rows), vector_count)
+                elif len(shard_rows) * expected[1] != expected[0] * vector_count:
+                    print(f"Shard {shard} wrote {len(shard_rows)} rows to {fname} for {vector_count} vectors, "
+                          f"shard 0 wrote {expected[0]} for {expected[1]}.")
+                    return False
+            rows.extend(shard_rows)
+        merged[fname] = rows
+
+    os.makedirs(hls_output_dir, exist_ok=True)
+    for fname, rows in merged.items():
+        with open(os.path.join(hls_output_dir, fname), 'w') as f:
+            f.writelines(rows)
+    return True
+
 
+def run_vitis_simulation(dat_file, hls_output_dir):
+    """
+    Run the Vitis flow on dat_file, with the testbench writing its spectra to hls_output_dir.
+    Rounds of at least 2 * min_shard_vectors vectors are split into up to simulation_shards shards that are simulated
+    side by side in their own project directories and merged back in vector order.
+    """
+    with open(dat_file, 'r') as f:
+        vector_count = sum(1 for _ in f) // lines_per_vector
+    shard_count = min(simulation_shards, vector_count // min_shard_vectors)
+    if shard_count <= 1:
+        simulate_shard(dat_file, hls_output_dir)
+        return
+
+    shards = split_shards(dat_file, hls_output_dir, shard_count)
+    print(f"Simulating {vector_count} vectors of {os.path.basename(dat_file)} in {shard_count} shards.")
+    round_id = spans.current_round()
+
+    def run_shard(shard, shard_dat_file, shard_output_dir):
+        with spans.round_scope(round_id):
+            simulate_shard(shard_dat_file, shard_output_dir, shard)
+
+    with ThreadPoolExecutor(max_workers=shard_count) as shard_executor:
+        futures = [
+            shard_executor.submit(run_shard, shard, shard_dat_file, shard_output_dir)
+            for shard, (shard_dat_file, shard_output_dir, _) in enumerate(shards)
+        ]
+        #  Raise the first failure once every shard has finished
+        for future in futures:
+            future.result()
+    if not merge_shards(shards, hls_output_dir):
+        print(f"Shard spectra of {os.path.basename(dat_file)} cannot be merged, simulating it in one run.")
+        simulate_shard(dat_file, hls_output_dir)
+
+
+def run_native_hls_test(test_id, dat_file):
+    """
+    Build the HLS kernel and testbench natively with g++ and the arbitrary-precision headers and run it
+    like csim does (`<dat_file> <output_dir>`). Returns the directory holding the native spectra.
+    """
+    native_output_dir = f"{hlso_base_dir}/n{test_id}"
+    os.makedirs(native_output_dir, exist_ok=True)
     kernel_src = f"{hlso_base_dir}/kernel.cpp"
     testbench_path = f"{hlso_base_dir}/kernel_testbench.cpp"
 
-    tcl_script_path = create_tcl_script(kernel_path=dat_file, testbench_path=testbench_path, kernel_src=kernel_src, output_dir=hls_output_dir)
-    run_tcl_script(tcl_script_path)
+    native_binary = build_cached_binary(
+        [kernel_src, testbench_path], native_build_dir, cpp_compiler,
+        cpp_build_flags() + [f"-I{hls_include_dir}"], "native"
+    )
+    run_command = f"{native_binary} {dat_file} {native_output_dir}"
+    print(f"Running native HLS screening for iteration {test_id} with command: {run_command}")
+    with spans.span("native_run"):
+        subprocess.run(run_command, shell=True, check=True)
+    return native_output_dir
+
+
+def select_vectors_for_simulation(test_id, native_output_dir, vector_count):
+    """
+    Pick the vectors that need a real HLS simulation: those whose native spectra differ from the CPU reference
+    and those that push a variable beyond the extremes seen so far in the campaign.
+    :return: Sorted 0-based vector indices, or None if the native spectra cannot be aligned with the vectors
+    """
+    cpp_output_dir = f"{co_base_dir}/p{test_id}"
+    selected = set()
+
+    for entry in rule_table:
+        hls_file = entry["hls_file"]
+        cpp_path = os.path.join(cpp_output_dir, entry["cpu_file"])
+        native_path = os.path.join(native_output_dir, hls_file)
+        if not os.path.exists(native_path):
+            continue
+
+        native_values = spectra.load_spectrum(native_path)
+        if len(native_values) != vector_count:
+            return None
+
+        if os.path.exists(cpp_path):
+            cpp_values = spectra.load_spectrum(cpp_path)
+            if len(cpp_values) != vector_count:
+                return None
+            selected.update(np.flatnonzero(spectra.mismatch_mask(cpp_values, native_values)).tolist())
+
+        if np.isnan(native_values).all():
+            continue
+        round_max, round_min, max_rows, min_rows = spectra.extreme_indices(native_values)
+        seen_min, seen_max = native_extremes.get(hls_file, (None, None))
+        if seen_min is None or round_min < seen_min:
+            selected.update(min_rows.tolist())
+            seen_min = round_min
+        if seen_max is None or round_max > seen_max:
+            selected.update(max_rows.tolist())
+            seen_max = round_max
+        native_extremes[hls_file] = (seen_min, seen_max)
+
+    return sorted(selected)
+
+
+def run_tiered_hls_test(test_id, dat_file, hls_output_dir):
+    """
+    Screen the round natively and only simulate the selected vectors in Vitis.
+    The HLS spectra of the round are the native rows with the selected rows replaced by the simulated ones,
+    so compare_results and the spectra files still see one row per vector in the original order.
+    """
+    with open(dat_file, 'r') as f:
+        vectors = f.readlines()
+
+    try:
+        native_output_dir = run_native_hls_test(test_id, dat_file)
+    except (subprocess.CalledProcessError, OSError) as e:
+        #  Missing headers, Vitis-only headers (hls_stream, hls_math) or a native crash: Vitis checks every vector
+        print(f"Native screening of iteration {test_id} failed ({e}), simulating all vectors.")
+        run_vitis_simulation(dat_file, hls_output_dir)
+        return
+    selected = select_vectors_for_simulation(test_id, native_output_dir, len(vectors))
+    if selected is None:
+        print(f"Native spectra of iteration {test_id} do not map one row per vector, simulating all vectors.")
+        run_vitis_simulation(dat_file, hls_output_dir)
+        return
+
+    print(f"Escalating {len(selected)} of {len(vectors)} vectors of iteration {test_id} to HLS simulation.")
+    os.makedirs(hls_output_dir, exist_ok=True)
+    simulated = {}
+    if selected:
+        sim_dat_file = os.path.join(hlso_base_dir, f"{test_id}_sim.dat")
+        sim_output_dir = f"{hlso_base_dir}/p{test_id}_sim"
+        with open(sim_dat_file, 'w') as f:
+            f.writelines(vectors[idx] for idx in selected)
+        run_vitis_simulation(sim_dat_file, sim_output_dir)
+        simulated = {fname: os.path.join(sim_output_dir, fname) for fname in os.listdir(sim_output_dir)}
 
-    spectre_files = ["input_a.txt", "input_b.txt", "add_result.txt", "subtract_result.txt", "divide.txt", "multiply.txt", "bitwise_and.txt", "bitwise_or.txt",  "bitwise_xor.txt", "mod_result.txt"]
     for fname in spectre_files:
+        native_path = os.path.join(native_output_dir, fname)
+        if not os.path.exists(native_path):
+            continue
+        with open(native_path, 'r') as f:
+            rows = f.readlines()
+        if fname in simulated:
+            with open(simulated[fname], 'r') as f:
+                sim_rows = f.readlines()
+            if len(sim_rows) != len(selected):
+                raise ValueError(f"Expected {len(selected)} simulated rows in {simulated[fname]}, got {len(sim_rows)}")
+            for idx, row in zip(selected, sim_rows):
+                rows[idx] = row
+        with open(os.path.join(hls_output_dir, fname), 'w') as f:
+            f.writelines(rows)
+
+
+def run_hls_test(test_id, dat_file):
+    global global_line_number
+    hls_output_dir = f"{hlso_base_dir}/p{test_id}"
+
+    if os.path.getsize(dat_file) == 0:
+        print(f"No vectors left to simulate for iteration {test_id}, skipping HLS.")
+        os.makedirs(hls_output_dir, exist_ok=True)
+        return
+
+    if tiered_simulation:
+        run_tiered_hls_test(test_id, dat_file, hls_output_dir)
+    else:
+        run_vitis_simulation(dat_file, hls_output_dir)
+
+    #  One bulk append per variable to the columnar spectra store
+    for entry in rule_table:
+        fname = entry["hls_file"]
         original_path = os.path.join(hls_output_dir, fname)
-        spectre_path = os.path.join(spectre_dir, f"{fname.split('.')[0]}_sp.txt")
         if os.path.exists(original_path):
-            with open(original_path, 'r') as original_file, open(spectre_path, 'a') as spectre_file:
-                for line_num, line in enumerate(original_file, start=global_line_number[fname]):
-                    spectre_file.write(f"{line_num} {line}")
-                    global_line_number[fname] += 1
-
-
-def detect_errors(diff_file, condition, error_type):
-    # Logic for detecting errors
-    errors_detected = []
-    with open(diff_file, 'r') as f:
-        for line in f:
-            parts = line.strip().split()
-            try:
-                cpp_result = float(parts[-2])
-                hls_result = float(parts[-1])
-                variable = " ".join(parts[:-2])
-                if condition(cpp_result, hls_result):
-                    errors_detected.append(f"{error_type}: Variable: {variable}, C++ Result: {cpp_result}, HLS Result: {hls_result}")
-            except ValueError:
-                # Ignore rows that cannot be converted to floating point numbers
-                continue
-    return errors_detected
+            values = spectra.load_spectrum(original_path)
+            global_line_number[fname] += spectra_store.append(spectre_dir, entry["variable"], test_id, values)
+
+
+# Buffer size of the diff and report writers
+compare_buffer_size = 1 << 20
+
+
+def compare_spectra_pair(cpp_path, hls_path, dat_file, checks):
+    """
+    Read a CPU/HLS spectra pair once, build the diff rows and evaluate every error check on the whole spectra.
+    :return: (diff rows, {error_type: detected errors}), or None if the two files have a different number of rows
+    """
+    with open(cpp_path, 'r') as cpp_f, open(hls_path, 'r') as hls_f:
+        cpp_lines = cpp_f.readlines()
+        hls_lines = hls_f.readlines()
+    if len(cpp_lines) != len(hls_lines):
+        return None
+
+    rows = []
+    for idx, (cpp_line, hls_line) in enumerate(zip(cpp_lines, hls_lines), start=1):
+        cpp_vals = cpp_line.strip().split()
+        hls_vals = hls_line.strip().split()
+        rows.append(f"{dat_file} {idx} {' '.join(cpp_vals[:-1])} {cpp_vals[-1]} {hls_vals[-1]}\n")
+
+    errors = {}
+    if checks:
+        cpp_values = spectra.load_spectrum(cpp_lines)
+        hls_values = spectra.load_spectrum(hls_lines)
+        for error_type, indices in spectra.classify(cpp_values, hls_values, checks).items():
+            errors[error_type] = set()
+            for idx in indices:
+                variable = " ".join(rows[idx].split()[:-2])
+                errors[error_type].add(
+                    f"{error_type}: Variable: {variable}, C++ Result: {float(cpp_values[idx])}, HLS Result: {float(hls_values[idx])}"
+                )
+    return rows, errors
+
 
 def compare_results(test_id, dat_file):
     global global_detected_errors
     cpp_output_dir = f"{co_base_dir}/p{test_id}"
     hls_output_dir = f"{hlso_base_dir}/p{test_id}"
-    diff_files = [
-        ("a.txt", "input_a.txt", "input_a_diff.txt"),
-        ("b.txt", "input_b.txt", "input_b_diff.txt"),
-        ("a+b.txt", "add_result.txt", "add_result_diff.txt"),
-        ("a-b.txt", "subtract_result.txt", "subtract_result_diff.txt"),
-        ("multiplyResult.txt", "multiply.txt", "multiply_diff.txt"),
-        ("divideResult.txt", "divede.txt", "divide_diff.txt"),
-        ("a&b.txt", "bitwise_and.txt", "and_diff.txt"),
-        ("a|b.txt", "bitwise_or.txt", "or_diff.txt"),
-        ("a^b.txt", "bitwise_xor.txt", "xor_diff.txt"),
-        ("/a%b.txt", "mod_result.txt", "mod_diff.txt"),
-    ]
 
     current_detected_errors = set()  #  Current round detected errors
 
-    for cpp_file, hls_file, diff_file in diff_files:
-        cpp_path = os.path.join(cpp_output_dir, cpp_file)
-        hls_path = os.path.join(hls_output_dir, hls_file)
-        diff_path = os.path.join(diff_dir, diff_file)
-
-        if os.path.exists(cpp_path) and os.path.exists(hls_path):
-            with open(cpp_path, 'r') as cpp_f, open(hls_path, 'r') as hls_f:
-                cpp_lines = cpp_f.readlines()
-                hls_lines = hls_f.readlines()
-                if len(cpp_lines) != len(hls_lines):
-                    print(f"Mismatch in number of lines between {cpp_file} and {hls_file}")
-                    continue
-
-                with open(diff_path, 'a') as diff_f:
-                    for idx, (cpp_line, hls_line) in enumerate(zip(cpp_lines, hls_lines), start=1):
-                        cpp_vals = cpp_line.strip().split()
-                        hls_vals = hls_line.strip().split()
-                        error_detail = f"{dat_file} {idx} {' '.join(cpp_vals[:-1])} {cpp_vals[-1]} {hls_vals[-1]}"
-                        diff_f.write(error_detail + "\n")
-                        diff_f.flush()  #  Ensure diff file is updated immediately
-
-                        #  Write immediately to report_file
-                        with open(report_file, 'a') as report:
-                            report.write(f"{error_detail}\n")
-                            report.flush()
-
-                        #  Detect specific error types
-                        variable = f"{dat_file} {idx}"
-                        if "add_result_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "add_result overflow")
-                            )
-
-                        if "multiply_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "multiply_result overflow")
-                            )
-
-                        if "input_a_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "input_a truncation")
-                            )
-
-                        if "input_b_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "input_b truncation")
-                            )
-                        if "divide_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "divide error")
-                            )
-                        if "subtract_result.txt" in hls_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: h == 0, "divide by zero error")
-                            )
-                        
-                        if "and_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "bitwise_and error")
-                            )
-
-                        if "or_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "bitwise_or error")
-                            )
-                        if "xor_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "bitwise_xor error")
-                            )
-                        
-                        if "xor_diff.txt" in diff_file and variable not in current_detected_errors:
-                            current_detected_errors.update(
-                                detect_errors(diff_path, lambda c, h: abs(h) < abs(c), "mod_result error")
-                            )
-
-    #  Calculate new errors detected in this iteration
-    new_errors = current_detected_errors - global_detected_errors
-
-    #  Update global detection status and write new errors to report file
-    with open(report_file, 'a') as report:
+    with open(report_file, 'a', buffering=compare_buffer_size) as report:
+        for entry in rule_table:
+            cpp_path = os.path.join(cpp_output_dir, entry["cpu_file"])
+            hls_path = os.path.join(hls_output_dir, entry["hls_file"])
+            diff_path = os.path.join(diff_dir, entry["diff_file"])
+
+            if not (os.path.exists(cpp_path) and os.path.exists(hls_path)):
+                continue
+
+            compared = compare_spectra_pair(cpp_path, hls_path, dat_file, entry["checks"])
+            if compared is None:
+                print(f"Mismatch in number of lines between {entry['cpu_file']} and {entry['hls_file']}")
+                continue
+
+            rows, errors = compared
+            with open(diff_path, 'a', buffering=compare_buffer_size) as diff_f:
+                diff_f.writelines(rows)
+            report.writelines(rows)
+            for error_type, detected in errors.items():
+                current_detected_errors.update(detected)
+                error_types[error_type] = True
+
+        #  Calculate new errors detected in this iteration
+        new_errors = current_detected_errors - global_detected_errors
+
+        #  Write new errors to report file
         for error in new_errors:
             report.write(f"{error}\n")
-        report.flush()
 
     #  Update global detected errors with current iteration errors
     global_detected_errors.update(current_detected_errors)
 
-    #  Update error detection status
-    for error in all_error_types:
-        if any(error in e for e in global_detected_errors):
-            error_types[error] = True
-
     return error_types
 
-def extract_first_errors(report_file, report_simple_file):
+
+def extract_first_errors(report_file, report_simple_file, index_file=None):
     """
     Extract the first occurrence of each error type from the report file and update the simplified report file.
+    Only the bytes appended to report_file since the previous call are parsed; the read offset and the first
+    occurrences are kept in a small JSON index, and report_simple_file is rewritten only when they change.
     :param report_file: Full error report file path
     :param report_simple_file: Simplified error report file path
+    :param index_file: Incremental index path (report_index_file by default)
     """
+    index_file = index_file or report_index_file
+
     #  Define regex pattern to parse error records
     error_pattern = re.compile(r"^(.*?): Variable: (.*?), C\+\+ Result: (.*?), HLS Result: (.*?)$")
 
-    #  Initialize storage for the first occurrence of each error type
+    #  Load the index; start over if report_file was truncated or replaced since it was written
+    offset = 0
     first_occurrences = {}
-
-    #  If report_simple_file exists, load the existing first error records
-    if os.path.exists(report_simple_file):
+    if os.path.exists(index_file):
+        with open(index_file, 'r') as f:
+            index = json.load(f)
+        if index["offset"] <= os.path.getsize(report_file):
+            offset = index["offset"]
+            first_occurrences = index["first_occurrences"]
+
+    #  Without an index, seed the first error records from an existing report_simple_file
+    elif os.path.exists(report_simple_file):
         with open(report_simple_file, 'r') as f:
             current_simple_content = f.read()
-
-        #  Parse the already recorded first errors
         for match in error_pattern.finditer(current_simple_content):
             error_type, variable, cpp_result, hls_result = match.groups()
             if error_type not in first_occurrences:
@@ -438,19 +1030,34 @@ def extract_first_errors(report_file, report_simple_file):
                     "hls_result": hls_result
                 }
 
-    #  Read report_file to extract new first error records
-    with open(report_file, 'r') as f:
-        for line in f:
-            match = error_pattern.match(line.strip())
-            if match:
-                error_type, variable, cpp_result, hls_result = match.groups()
-                #  Update the record if this error type has not been recorded yet or if the new variable appears earlier in the log
-                if error_type not in first_occurrences or variable < first_occurrences[error_type]['variable']:
-                    first_occurrences[error_type] = {
-                        "variable": variable,
-                        "cpp_result": cpp_result,
-                        "hls_result": hls_result
-                    }
+    #  Read only the complete lines appended since the last offset
+    changed = not os.path.exists(report_simple_file)
+    with open(report_file, 'rb') as f:
+        f.seek(offset)
+        appended = f.read()
+    complete = appended[:appended.rfind(b"\n") + 1]
+    for line in complete.decode(errors='replace').splitlines():
+        match = error_pattern.match(line.strip())
+        if match:
+            error_type, variable, cpp_result, hls_result = match.groups()
+            #  Update the record if this error type has not been recorded yet or if the new variable appears earlier in the log
+            if error_type not in first_occurrences or variable < first_occurrences[error_type]['variable']:
+                first_occurrences[error_type] = {
+                    "variable": variable,
+                    "cpp_result": cpp_result,
+                    "hls_result": hls_result
+                }
+                changed = True
+    offset += len(complete)
+
+    tmp_file = index_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump({"offset": offset, "first_occurrences": first_occurrences}, f)
+    os.replace(tmp_file, index_file)
+
+    if not changed:
+        print(f"Simplified report unchanged: {report_simple_file}")
+        return
 
     #  Sort all first error records by error type and write them to report_simple_file
     sorted_errors = sorted(first_occurrences.items(), key=lambda x: x[0])
@@ -463,23 +1070,241 @@ def extract_first_errors(report_file, report_simple_file):
     print(f"Simplified report updated in: {report_simple_file}")
 
 
-def run_mutation(input_file, output_file, mutate_ratio):
+def run_mutation(input_file, output_file, mutate_ratio, seed=None, round_id=None):
     """
     Run the mutate.py script and pass in the mutate_ratio parameter.
     Make sure the output file name conforms to the parsing rules of mutate.py and save the mutation record.
+    :param seed: Optional random seed for mutate.py, drawn from the campaign RNG so resumed runs stay reproducible
+    :param round_id: Round the mutation span is attributed to; with redundancy filtering, its row map tells mutate.py
+                     which line of input_file each recorded spectra row belongs to
     """
     mutation_file = output_file.replace(".dat", "_mutation.dat")  
     sanitized_output_file = output_file.replace("_mutate", "")  
     print(f"Running mutation script to generate {sanitized_output_file} and record to {mutation_file}...")
-    subprocess.run(
-        ["python3", mutate_script, input_file, sanitized_output_file, str(mutate_ratio)],
-        check=True
-    )
+    command = ["python3", mutate_script, input_file, sanitized_output_file, str(mutate_ratio)]
+    if seed is not None:
+        command.append(str(seed))
+    #  mutate.py keeps its check/ and spectre/ directories under the same base directory as this script
+    env = dict(os.environ, HLSOLLM_BASE_DIR=hlso_base_dir)
+    if redundancy_filtering and round_id is not None:
+        env["HLSOLLM_MUTATION_ROWS"] = simulation_row_map_file(round_id)
+    with spans.round_scope(round_id), spans.span("mutation"):
+        subprocess.run(command, check=True, env=env)
     print(f"Mutation records saved to: {mutation_file}")
 
 
 
-def main():
+def simulation_input_file(test_id, dat_file):
+    """The .dat file that is actually simulated in a round: the filtered copy when redundancy filtering is on"""
+    if redundancy_filtering:
+        return os.path.join(hlso_base_dir, f"{test_id}_raf.dat")
+    return dat_file
+
+
+def simulation_row_map_file(test_id):
+    """Line position (0-based, one per line) in the round's .dat file of the first line of every vector of its filtered simulation input"""
+    return os.path.join(hlso_base_dir, f"{test_id}_raf_rows.txt")
+
+
+def write_row_map(test_id, positions):
+    with open(simulation_row_map_file(test_id), 'w') as f:
+        f.writelines(f"{position}\n" for position in positions)
+
+
+def read_row_map(test_id):
+    with open(simulation_row_map_file(test_id), 'r') as f:
+        return [int(line) for line in f if line.strip()]
+
+
+def filter_round(test_id, dat_file, equivalence_key=None):
+    """
+    Drop the vectors of dat_file that were already simulated and write the rest to the round's simulation input,
+    along with the row map that relates its rows (and so the HLS spectra rows) back to the lines of dat_file.
+    :return: Index keys of the kept vectors, committed by simulate_round once they have been simulated
+    """
+    if not redundancy_filtering:
+        return []
+    sim_file = simulation_input_file(test_id, dat_file)
+    keys, kept, dropped = raf.filter_dat_file(dat_file, sim_file, raf_index, equivalence_key, lines_per_vector)
+    write_row_map(test_id, kept)
+    print(f"Redundancy filter for iteration {test_id}: kept {len(kept)} vectors, dropped {dropped} already simulated.")
+    return keys
+
+
+def predictive_filter(test_id, sim_file, keys):
+    """
+    Drop the vectors of sim_file whose CPU spectra signature was already simulated and cut the CPU spectra of the round
+    down to the kept rows, so that the HLS run and the comparison see the same vectors.
+    :param keys: Index keys returned by filter_round for sim_file
+    :return: Index keys of the vectors left in sim_file
+    """
+    cpp_output_dir = f"{co_base_dir}/p{test_id}"
+    with open(sim_file, 'r') as f:
+        vectors, _ = raf.split_vectors(f.readlines(), lines_per_vector)
+
+    #  Every CPU file of the rule table is cut down to the kept rows, the signature only uses those of signature_variables
+    cpu_lines = {}
+    for entry in rule_table:
+        cpu_path = os.path.join(cpp_output_dir, entry["cpu_file"])
+        if entry["cpu_file"] in cpu_lines or not os.path.exists(cpu_path):
+            continue
+        with open(cpu_path, 'r') as f:
+            cpu_lines[entry["cpu_file"]] = f.readlines()
+        if len(cpu_lines[entry["cpu_file"]]) != len(vectors):
+            print(f"CPU spectra of iteration {test_id} do not map one row per vector, predictive skip disabled for this round.")
+            return keys
+    signature_files = {entry["cpu_file"] for entry in rule_table if signature_variables is None or entry["variable"] in signature_variables}
+    names = [name for name in cpu_lines if name in signature_files]
+    if not vectors or not names:
+        return keys
+
+    columns = [spectra.load_spectrum(cpu_lines[name]) for name in names]
+    with cpu_extremes_lock:
+        boundary = raf.boundary_rows(columns, names, cpu_extremes, signature_limits)
+    signatures = raf.spectra_signatures(columns, signature_quantum)
+
+    with raf.index_lock:
+        kept, new_keys, dropped = raf.filter_vectors(
+            vectors, raf_index, equivalence_key=lambda position, line: signatures[position], keep_positions=boundary
+        )
+    print(f"Predictive skip for iteration {test_id}: kept {len(kept)} vectors, dropped {dropped} with a simulated CPU signature.")
+    if dropped:
+        with open(sim_file, 'w') as f:
+            f.writelines(vectors[pos] for pos in kept)
+        row_map = read_row_map(test_id)
+        write_row_map(test_id, [row_map[pos] for pos in kept])
+        for name, rows in cpu_lines.items():
+            with open(os.path.join(cpp_output_dir, name), 'w') as f:
+                f.writelines(rows[pos] for pos in kept)
+    return new_keys
+
+
+def reference_round(test_id, sim_file, keys):
+    """
+    CPU reference run of a round, followed by the predictive skip when enabled.
+    :param keys: Index keys returned by filter_round
+    :return: Index keys to commit once the round has been simulated
+    """
+    with spans.round_scope(test_id):
+        run_cpp_test(test_id, sim_file)
+        if redundancy_filtering and predictive_skip:
+            keys = predictive_filter(test_id, sim_file, keys)
+    #  Taken for every round, also when the predictive skip returned early, so a checkpoint never sees later rounds
+    with cpu_extremes_lock:
+        cpu_extremes_by_round[test_id] = dict(cpu_extremes)
+    return keys
+
+
+def simulate_round(test_id, sim_file, keys):
+    """Run the HLS stage and record the simulated vectors in the redundancy index"""
+    with spans.round_scope(test_id):
+        run_hls_test(test_id, sim_file)
+    raf.commit_keys(raf_index_file, raf_index, keys)
+
+
+def appended_files():
+    """Append-only campaign outputs; their sizes are checkpointed so a resume can cut off a partially recorded round"""
+    files = [report_file, raf_index_file]
+    files.extend(os.path.join(diff_dir, fname) for fname in sorted(os.listdir(diff_dir)))
+    for variable in spectra_store.variables(spectre_dir):
+        directory = spectra_store.variable_dir(spectre_dir, variable)
+        files.extend(os.path.join(directory, fname) for fname in (spectra_store.values_name, spectra_store.index_name))
+    return files
+
+
+def save_checkpoint(next_test_id):
+    """
+    Atomically write the orchestrator state after a completed round: the next round to run, spectra line offsets,
+    detected errors, screening extremes, the RNG state, the mutation weights and the sizes of the append-only outputs.
+    """
+    last_round = next_test_id - 1
+    mutation_weights = None
+    if os.path.exists(mutation_weights_file):
+        with open(mutation_weights_file, 'r') as f:
+            mutation_weights = json.load(f)
+    version, internal_state, gauss_next = random.getstate()
+    with cpu_extremes_lock:
+        round_extremes = dict(cpu_extremes_by_round.get(last_round, cpu_extremes))
+        for test_id in [t for t in cpu_extremes_by_round if t < last_round]:
+            del cpu_extremes_by_round[test_id]
+
+    state = {
+        "test_id": next_test_id,
+        "global_line_number": global_line_number,
+        "error_types": error_types,
+        "detected_errors": sorted(global_detected_errors),
+        "native_extremes": {k: [float(v) for v in mm] for k, mm in native_extremes.items()},
+        "cpu_extremes": {k: [float(v) for v in mm] for k, mm in round_extremes.items()},
+        "random_state": [version, list(internal_state), gauss_next],
+        "mutation_weights": mutation_weights,
+        "file_sizes": {path: os.path.getsize(path) for path in appended_files() if os.path.exists(path)},
+    }
+
+    tmp_file = checkpoint_file + ".tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, checkpoint_file)
+    print(f"Checkpoint saved: next iteration {next_test_id}")
+
+
+def load_checkpoint():
+    """
+    Restore the orchestrator state written by save_checkpoint and cut the append-only outputs back to their
+    checkpointed sizes, dropping whatever a round interrupted after the checkpoint had already written.
+    :return: The round to continue from
+    """
+    with open(checkpoint_file, 'r') as f:
+        state = json.load(f)
+
+    global_line_number.update(state["global_line_number"])
+    error_types.update(state["error_types"])
+    global_detected_errors.clear()
+    global_detected_errors.update(state["detected_errors"])
+    native_extremes.clear()
+    native_extremes.update({k: tuple(mm) for k, mm in state["native_extremes"].items()})
+    with cpu_extremes_lock:
+        cpu_extremes.clear()
+        cpu_extremes.update({k: tuple(mm) for k, mm in state["cpu_extremes"].items()})
+        cpu_extremes_by_round.clear()
+    version, internal_state, gauss_next = state["random_state"]
+    random.setstate((version, tuple(internal_state), gauss_next))
+
+    if state["mutation_weights"] is not None:
+        os.makedirs(os.path.dirname(mutation_weights_file), exist_ok=True)
+        with open(mutation_weights_file, 'w') as f:
+            json.dump(state["mutation_weights"], f)
+
+    file_sizes = state["file_sizes"]
+    for path in appended_files():
+        if not os.path.exists(path):
+            continue
+        if path not in file_sizes:
+            os.remove(path)
+        elif os.path.getsize(path) > file_sizes[path]:
+            with open(path, 'r+') as f:
+                f.truncate(file_sizes[path])
+    raf_index.clear()
+    if redundancy_filtering:
+        raf_index.update(raf.load_index(raf_index_file))
+
+    #  The simplified report and its index are rebuilt from the truncated report.txt
+    for path in (report_simple_file, report_index_file):
+        if os.path.exists(path):
+            os.remove(path)
+
+    print(f"Resuming from checkpoint at iteration {state['test_id']}")
+    return state["test_id"]
+
+
+def main(resume=False, max_rounds=None):
+    """
+    Run the testing campaign until every error type is detected.
+    :param resume: Continue from the last checkpoint instead of starting at round 1
+    :param max_rounds: Stop after this many rounds even if some error types are still undetected
+    """
+    global gpt_vector_queue, gpt_prefetch_stop, gpt_example_file
     test_id = 1
     kernel_file = os.path.join(hlso_base_dir, "kernel.cpp")
 
@@ -493,66 +1318,100 @@ def main():
 
     print(f"Initial total vectors: {total_vectors}")
 
-    #  File paths
-    report_simple_file = os.path.join(hlso_base_dir, "report_simple.txt")
-
      # Define mutate_ratio
     mutate_ratio = 0.7
     gpt_ratio = 1.0 - mutate_ratio
+    gpt_count = round(total_vectors * gpt_ratio)
 
-    while True:
-        #  Define input and output file paths
+    #  The stages of a round run one after another: the next round's vectors come from mutation(N), which reads the
+    #  spectra of hls(N), and with tiered simulation or the predictive skip hls(N) needs cpp(N), so there is no stage
+    #  of round N+1 that could run during the HLS run of round N. The GPT vectors are requested ahead of time by the
+    #  prefetch thread instead.
+    dat_file = initial_dat_file
+    if resume and os.path.exists(checkpoint_file):
+        test_id = load_checkpoint()
         dat_file = os.path.join(hlso_base_dir, f"{test_id}.dat")
-        print(f"Running C++ test for iteration {test_id}...")
-
-        #  Run C++ test
-        run_cpp_test(test_id, dat_file)
-
-        print(f"Running HLS synthesis for iteration {test_id}...")
-        #  Run HLS test
-        run_hls_test(test_id, dat_file)
-
-        print(f"Comparing results for iteration {test_id}...")
-        #  Compare results, detect new errors, and write to report.txt
-        detected = compare_results(test_id, dat_file)
-
-        #  Update simplified error report
-        print(f"Updating simplified report...")
-        extract_first_errors(report_file, report_simple_file)
-
-        #  Print detected error status
-        print(f"Detected errors: {detected}")
-
-        #  Stop iteration if all error types are detected
-        if all(detected.values()):
-            print("All error types detected. Stopping testing.")
-            break
-
-
-        #  Generate mutated test vector using mutate.py
-        mutation_file = os.path.join(hlso_base_dir, f"{test_id}_mutation.dat")
-        print(f"Generating mutated test vector for iteration {test_id}...")
-        run_mutation(dat_file, mutation_file, mutate_ratio=mutate_ratio)
-
-        #  Generate new test vector using GPT
-        gpt_file = os.path.join(gt_dir, f"gt{test_id}.dat")
-        print(f"Generating GPT test vector for iteration {test_id}...")
-        generate_gpt_test_vector(kernel_file, dat_file, test_id)
-
-        #  Combine to generate the next round test file
-        combined_file = os.path.join(hlso_base_dir, f"{test_id + 1}.dat")
-        print(f"Combining test vectors for iteration {test_id + 1}...")
-        generate_combined_dat_file(
-            gpt_file=gpt_file,
-            mutation_file=mutation_file,
-            output_file=combined_file,
-            gpt_ratio=gpt_ratio,  #  GPT test case ratio
-            mutate_ratio=mutate_ratio,  #  Mutate test case ratio
-            total_vectors=total_vectors
-        )
 
-        print(f"Test file for iteration {test_id + 1} generated.")
-        test_id += 1
+    first_round = test_id
+    if gpt_prefetch:
+        #  New ones per campaign, so a producer left over from an earlier campaign in this process cannot feed this one
+        gpt_vector_queue = queue.Queue(maxsize=gpt_prefetch_limit)
+        gpt_prefetch_stop = threading.Event()
+        gpt_example_file = dat_file
+        prefetcher = threading.Thread(
+            target=prefetch_gpt_vectors, args=(kernel_file, gpt_vector_queue, gpt_prefetch_stop), daemon=True
+        )
+        prefetcher.start()
+
+    try:
+        while True:
+            sim_file = simulation_input_file(test_id, dat_file)
+            print(f"Running C++ test for iteration {test_id}...")
+            keys = filter_round(test_id, dat_file)
+            keys = reference_round(test_id, sim_file, keys)
+
+            print(f"Running HLS synthesis for iteration {test_id}...")
+            simulate_round(test_id, sim_file, keys)
+
+            print(f"Comparing results for iteration {test_id}...")
+            with spans.round_scope(test_id):
+                #  Compare results, detect new errors, and write to report.txt
+                with spans.span("diff"):
+                    detected = compare_results(test_id, sim_file)
+
+                #  Update simplified error report
+                print(f"Updating simplified report...")
+                with spans.span("report"):
+                    extract_first_errors(report_file, report_simple_file)
+
+            #  Print detected error status
+            print(f"Detected errors: {detected}")
+
+            #  Stop iteration if all error types are detected
+            if all(detected.values()):
+                print("All error types detected. Stopping testing.")
+                break
+
+            #  Generate mutated test vector using mutate.py
+            mutation_file = os.path.join(hlso_base_dir, f"{test_id}_mutation.dat")
+            print(f"Generating mutated test vector for iteration {test_id}...")
+            mutation_seed = random.randrange(2**32)
+            run_mutation(dat_file, mutation_file, mutate_ratio, mutation_seed, test_id)
+
+            #  Generate new test vector using GPT
+            gpt_file = os.path.join(gt_dir, f"gt{test_id}.dat")
+            print(f"Generating GPT test vector for iteration {test_id}...")
+            generate_gpt_test_vector(kernel_file, dat_file, test_id, gpt_count)
+
+            #  Combine to generate the next round test file
+            combined_file = os.path.join(hlso_base_dir, f"{test_id + 1}.dat")
+            print(f"Combining test vectors for iteration {test_id + 1}...")
+            generate_combined_dat_file(
+                gpt_file=gpt_file,
+                mutation_file=mutation_file,
+                output_file=combined_file,
+                gpt_ratio=gpt_ratio,  #  GPT test case ratio
+                mutate_ratio=mutate_ratio,  #  Mutate test case ratio
+                total_vectors=total_vectors
+            )
+
+            print(f"Test file for iteration {test_id + 1} generated.")
+            if test_id % checkpoint_interval == 0:
+                save_checkpoint(test_id + 1)
+            if max_rounds is not None and test_id - first_round + 1 >= max_rounds:
+                print(f"Reached {max_rounds} rounds. Stopping testing.")
+                break
+            dat_file = combined_file
+            gpt_example_file = dat_file
+            test_id += 1
+    finally:
+        gpt_prefetch_stop.set()
+        spans.write_summary(spans_summary_file)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--resume", action="store_true", help="continue the campaign from the last checkpoint")
+    parser.add_argument("--max-rounds", type=int, default=None, help="stop after this many rounds")
+    args = parser.parse_args()
+    main(resume=args.resume, max_rounds=args.max_rounds)
\ No newline at end of file